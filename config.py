@@ -4,12 +4,36 @@ Supports both Jamix and Mealdoo API formats, and multiple API sources per server
 """
 import json
 import os
+import sqlite3
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
+from json_writer import DebouncedJsonWriter
+
+# Settings given to a server the first time it is seen
+DEFAULT_MENU_CONFIG = {
+    "api_type": "jamix",  # "jamix", "mealdoo", or "compass"
+    "customer_id": "12345",
+    "kitchen_id": "12",
+    "site_id": None,  # Deprecated - use site_path for Mealdoo
+    "site_path": None,  # For Mealdoo API (e.g., "org/location")
+    "cost_center": None,  # For Compass Group API (e.g., "1234")
+    "daily_post_time": "07:00",
+    "daily_channel_id": None,
+    "language": "fi"
+}
+
+# A source's "horizon_days" may not exceed this; Mealdoo dates are batched this many per request
+MAX_HORIZON_DAYS = 28
+MEALDOO_DATES_PER_REQUEST = 28
+
 class ServerConfig:
-    def __init__(self, config_file: str = "config/server_config.json"):
+    def __init__(self, config_file: str = "config/server_config.json", save_delay: float = 2.0):
         self.config_file = config_file
+        self._writer = DebouncedJsonWriter(
+            config_file, lambda: json.dumps(self.config, indent=2, ensure_ascii=False), save_delay, label="config"
+        )
         self.config = self._load_config()
     
     def _load_config(self) -> Dict:
@@ -29,32 +53,25 @@ class ServerConfig:
         # Default configuration
         return {
             "servers": {},
-            "default_menu_config": {
-                "api_type": "jamix",  # "jamix", "mealdoo", or "compass"
-                "customer_id": "12345",
-                "kitchen_id": "12",
-                "site_id": None,  # Deprecated - use site_path for Mealdoo
-                "site_path": None,  # For Mealdoo API (e.g., "org/location")
-                "cost_center": None,  # For Compass Group API (e.g., "1234")
-                "daily_post_time": "07:00",
-                "daily_channel_id": None,
-                "language": "fi"
-            }
+            "default_menu_config": DEFAULT_MENU_CONFIG.copy()
         }
     
     def save_config(self) -> None:
-        """Save configuration to file"""
-        try:
-            # Create directory if it doesn't exist
-            config_dir = os.path.dirname(self.config_file)
-            if config_dir and not os.path.exists(config_dir):
-                os.makedirs(config_dir, exist_ok=True)
-            
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error saving config: {e}")
-    
+        """Schedule a save of the configuration (coalesced for save_delay seconds inside the event loop)"""
+        self._writer.schedule()
+
+    def flush(self) -> None:
+        """Write any pending changes right now (used on shutdown)"""
+        self._writer.flush()
+
+    def close(self) -> None:
+        """Nothing is held open by the JSON backend; pending writes are written by flush"""
+
+    def _store_server(self, guild_str: str, server_config: Dict) -> None:
+        """Persist one server's configuration"""
+        self.config["servers"][guild_str] = server_config
+        self.save_config()
+
     def get_server_config(self, guild_id: int) -> Dict:
         """Get configuration for a specific server"""
         guild_str = str(guild_id)
@@ -113,8 +130,7 @@ class ServerConfig:
                 sources.append(new_source)
         server_config["menu_sources"] = sources
 
-        self.config["servers"][guild_str] = server_config
-        self.save_config()
+        self._store_server(guild_str, server_config)
 
     def get_menu_sources(self, guild_id: int) -> List[Dict]:
         """Get all menu sources for a server. Migrates from legacy single-source config if needed."""
@@ -122,8 +138,21 @@ class ServerConfig:
         sources = config.get("menu_sources")
         if sources:
             return sources
+        return self._legacy_sources(config)
+
+    @staticmethod
+    def is_placeholder(config: Dict) -> bool:
+        """True for a server that still has the auto-created default (placeholder Jamix IDs, no sources)"""
+        return (
+            not config.get("menu_sources")
+            and config.get("api_type", "jamix") == "jamix"
+            and config.get("customer_id") == DEFAULT_MENU_CONFIG["customer_id"]
+            and config.get("kitchen_id") == DEFAULT_MENU_CONFIG["kitchen_id"]
+        )
 
-        # Backward-compat: build a single source from the old flat config
+    @staticmethod
+    def _legacy_sources(config: Dict) -> List[Dict]:
+        """Backward-compat: build a single source from the old flat config"""
         api_type = config.get("api_type", "jamix")
         language = config.get("language", "fi")
         source: Dict = {"name": "Ruokalista", "api_type": api_type, "language": language}
@@ -166,8 +195,7 @@ class ServerConfig:
         if not replaced:
             config["menu_sources"].append(source)
 
-        self.config["servers"][guild_str] = config
-        self.save_config()
+        self._store_server(guild_str, config)
 
     def remove_menu_source(self, guild_id: int, name: str) -> bool:
         """Remove a named menu source. Returns True if removed, False if not found."""
@@ -182,18 +210,35 @@ class ServerConfig:
         after = len(config["menu_sources"])
 
         if before != after:
-            self.config["servers"][guild_str] = config
-            self.save_config()
+            self._store_server(guild_str, config)
             return True
         return False
     
+    def set_source_horizon(self, guild_id: int, name: str, horizon_days: Optional[int]) -> bool:
+        """Set how many days ahead a named source is fetched (None restores the default).
+        Returns True if the source was found."""
+        guild_str = str(guild_id)
+        config = self.get_server_config(guild_id)
+
+        if "menu_sources" not in config:
+            config["menu_sources"] = self.get_menu_sources(guild_id)
+
+        for source in config["menu_sources"]:
+            if source.get("name") == name:
+                if horizon_days:
+                    source["horizon_days"] = horizon_days
+                else:
+                    source.pop("horizon_days", None)
+                self._store_server(guild_str, config)
+                return True
+        return False
+
     def set_daily_channel(self, guild_id: int, channel_id: int) -> None:
         """Set daily posting channel for a server"""
         guild_str = str(guild_id)
         server_config = self.get_server_config(guild_id)
         server_config["daily_channel_id"] = channel_id
-        self.config["servers"][guild_str] = server_config
-        self.save_config()
+        self._store_server(guild_str, server_config)
     
     def get_menu_url_for_source(self, source: Dict, target_date: Optional[datetime] = None) -> str:
         """Get the API URL for a given source config dict."""
@@ -201,14 +246,8 @@ class ServerConfig:
         language = source.get("language", "fi")
 
         if api_type == "mealdoo":
-            site_path = source.get("site_path", "org/location")
             start_date = target_date if target_date else datetime.now()
-            dates = []
-            for i in range(7):
-                day = start_date + timedelta(days=i)
-                dates.append(f"{day.year}-{day.month:02d}-{day.day:02d}")
-            dates_param = ",".join(dates)
-            return f"https://api.fi.poweresta.com/publicmenu/dates/{site_path}/?menu=Ruokalista&dates={dates_param}"
+            return self._mealdoo_url(source, [start_date + timedelta(days=i) for i in range(7)])
         elif api_type == "compass":
             cost_center = source.get("cost_center", "1234")
             use_date = target_date if target_date else datetime.now()
@@ -219,6 +258,40 @@ class ServerConfig:
             kitchen_id = source.get("kitchen_id", "12")
             return f"https://fi.jamix.cloud/apps/menuservice/rest/haku/menu/{customer_id}/{kitchen_id}?lang={language}"
 
+    def get_menu_urls_for_source(self, source: Dict, horizon_days: int = 7,
+                                 start: Optional[datetime] = None) -> List[str]:
+        """Get the fewest API URLs that together cover horizon_days days from start (default today).
+
+        Mealdoo takes a list of dates, so the whole horizon is batched into as few calls as its
+        date limit allows. Compass serves one week per call, so there is one URL per calendar
+        week touched. Jamix always returns everything it has in a single call.
+        """
+        api_type = source.get("api_type", "jamix")
+        start = start if start else datetime.now()
+        horizon_days = max(int(horizon_days), 1)
+
+        if api_type == "mealdoo":
+            days = [start + timedelta(days=i) for i in range(horizon_days)]
+            return [self._mealdoo_url(source, days[i:i + MEALDOO_DATES_PER_REQUEST])
+                    for i in range(0, len(days), MEALDOO_DATES_PER_REQUEST)]
+        elif api_type == "compass":
+            # The first window keeps today's date so its URL matches get_menu_url_for_source
+            last_day = start + timedelta(days=horizon_days - 1)
+            urls = [self.get_menu_url_for_source(source, start)]
+            monday = start + timedelta(days=7 - start.weekday())
+            while monday.date() <= last_day.date():
+                urls.append(self.get_menu_url_for_source(source, monday))
+                monday += timedelta(days=7)
+            return urls
+        else:
+            return [self.get_menu_url_for_source(source, start)]
+
+    @staticmethod
+    def _mealdoo_url(source: Dict, days: List[datetime]) -> str:
+        site_path = source.get("site_path", "org/location")
+        dates_param = ",".join(f"{day.year}-{day.month:02d}-{day.day:02d}" for day in days)
+        return f"https://api.fi.poweresta.com/publicmenu/dates/{site_path}/?menu=Ruokalista&dates={dates_param}"
+
     def get_menu_url(self, guild_id: int, target_date: Optional[datetime] = None) -> str:
         """Get the API URL for a server — uses the first configured source.
 
@@ -239,3 +312,220 @@ class ServerConfig:
         """List all configured servers"""
         return self.config["servers"]
 
+    def list_daily_servers(self) -> Dict:
+        """List the servers that have a daily posting channel set"""
+        return {g: c for g, c in self.config["servers"].items() if c.get("daily_channel_id")}
+
+class SqliteServerConfig(ServerConfig):
+    """ServerConfig stored in SQLite with one row per guild and one row per menu source.
+
+    Reads and writes only touch the affected guild's rows, and guilds that have been
+    loaded are kept in memory. On first start an existing server_config.json is imported.
+    """
+
+    GUILD_COLUMNS = ("api_type", "customer_id", "kitchen_id", "site_id", "site_path",
+                     "cost_center", "daily_post_time", "daily_channel_id", "language")
+    SOURCE_COLUMNS = ("name", "api_type", "customer_id", "kitchen_id", "site_path", "cost_center", "language")
+
+    def __init__(self, db_path: str = "config/server_config.db", json_file: str = "config/server_config.json"):
+        self.db_path = db_path
+        self.config_file = json_file
+        self._cache: Dict[str, Dict] = {}
+        self._lock = threading.RLock()
+
+        config_dir = os.path.dirname(db_path)
+        if config_dir and not os.path.exists(config_dir):
+            os.makedirs(config_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_db()
+        self._migrate_from_json()
+        self.default_menu_config = self._load_default_config()
+
+    def _init_db(self) -> None:
+        with self._lock:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS guild_config (
+                    guild_id TEXT PRIMARY KEY,
+                    api_type TEXT,
+                    customer_id TEXT,
+                    kitchen_id TEXT,
+                    site_id TEXT,
+                    site_path TEXT,
+                    cost_center TEXT,
+                    daily_post_time TEXT,
+                    daily_channel_id INTEGER,
+                    language TEXT,
+                    has_sources INTEGER NOT NULL DEFAULT 0,
+                    extra TEXT
+                )
+            ''')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS menu_sources (
+                    guild_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    name TEXT,
+                    api_type TEXT,
+                    customer_id TEXT,
+                    kitchen_id TEXT,
+                    site_path TEXT,
+                    cost_center TEXT,
+                    language TEXT,
+                    extra TEXT,
+                    PRIMARY KEY (guild_id, position)
+                )
+            ''')
+            self._conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_guild_config_daily_channel
+                ON guild_config(daily_channel_id) WHERE daily_channel_id IS NOT NULL
+            ''')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS config_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            self._conn.commit()
+
+    def _migrate_from_json(self) -> None:
+        """One-time import of the JSON config file, including legacy flat single-source servers"""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM config_meta WHERE key = 'migrated_from_json'").fetchone():
+                return
+
+            data = None
+            if os.path.exists(self.config_file):
+                try:
+                    with open(self.config_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except (json.JSONDecodeError, FileNotFoundError):
+                    print(f"Error loading config file {self.config_file}, skipping migration")
+
+            if data:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO config_meta (key, value) VALUES ('default_menu_config', ?)",
+                    (json.dumps(data.get("default_menu_config", DEFAULT_MENU_CONFIG), ensure_ascii=False),),
+                )
+                for guild_str, server_config in data.get("servers", {}).items():
+                    server_config = dict(server_config)
+                    if not server_config.get("menu_sources"):
+                        server_config["menu_sources"] = self._legacy_sources(server_config)
+                    self._write_server(guild_str, server_config)
+                print(f"Migrated {len(data.get('servers', {}))} server(s) from {self.config_file} to {self.db_path}")
+
+            self._conn.execute("INSERT OR REPLACE INTO config_meta (key, value) VALUES ('migrated_from_json', '1')")
+            self._conn.commit()
+
+    def _load_default_config(self) -> Dict:
+        row = self._conn.execute("SELECT value FROM config_meta WHERE key = 'default_menu_config'").fetchone()
+        return json.loads(row[0]) if row else DEFAULT_MENU_CONFIG.copy()
+
+    # ------------------------------------------------------------------ #
+    #  Row mapping                                                         #
+    # ------------------------------------------------------------------ #
+
+    @staticmethod
+    def _split(config: Dict, columns: tuple, skip: tuple = ()) -> tuple:
+        """Return (column values, JSON of every other key)"""
+        values = tuple(config.get(c) for c in columns)
+        extra = {k: v for k, v in config.items() if k not in columns and k not in skip}
+        return values, (json.dumps(extra, ensure_ascii=False) if extra else None)
+
+    @staticmethod
+    def _join(columns: tuple, values: tuple, extra: Optional[str]) -> Dict:
+        """Rebuild a config dict; NULL columns are left out so .get() defaults still apply"""
+        config = {c: v for c, v in zip(columns, values) if v is not None}
+        if extra:
+            config.update(json.loads(extra))
+        return config
+
+    def _write_server(self, guild_str: str, server_config: Dict) -> None:
+        """Replace one guild's rows (caller holds the lock and commits)"""
+        values, extra = self._split(server_config, self.GUILD_COLUMNS, skip=("menu_sources",))
+        has_sources = 1 if "menu_sources" in server_config else 0
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO guild_config (guild_id, {', '.join(self.GUILD_COLUMNS)}, has_sources, extra) "
+            f"VALUES (?, {', '.join('?' * len(self.GUILD_COLUMNS))}, ?, ?)",
+            (guild_str, *values, has_sources, extra),
+        )
+        self._conn.execute("DELETE FROM menu_sources WHERE guild_id = ?", (guild_str,))
+        rows = []
+        for position, source in enumerate(server_config.get("menu_sources") or []):
+            source_values, source_extra = self._split(source, self.SOURCE_COLUMNS)
+            rows.append((guild_str, position, *source_values, source_extra))
+        self._conn.executemany(
+            f"INSERT INTO menu_sources (guild_id, position, {', '.join(self.SOURCE_COLUMNS)}, extra) "
+            f"VALUES (?, ?, {', '.join('?' * len(self.SOURCE_COLUMNS))}, ?)",
+            rows,
+        )
+
+    def _read_server(self, guild_str: str) -> Optional[Dict]:
+        row = self._conn.execute(
+            f"SELECT {', '.join(self.GUILD_COLUMNS)}, has_sources, extra FROM guild_config WHERE guild_id = ?",
+            (guild_str,),
+        ).fetchone()
+        if not row:
+            return None
+
+        server_config = self._join(self.GUILD_COLUMNS, row[:len(self.GUILD_COLUMNS)], row[-1])
+        if row[-2]:
+            server_config["menu_sources"] = [
+                self._join(self.SOURCE_COLUMNS, source_row[:-1], source_row[-1])
+                for source_row in self._conn.execute(
+                    f"SELECT {', '.join(self.SOURCE_COLUMNS)}, extra FROM menu_sources WHERE guild_id = ? ORDER BY position",
+                    (guild_str,),
+                )
+            ]
+        return server_config
+
+    # ------------------------------------------------------------------ #
+    #  Storage overrides                                                   #
+    # ------------------------------------------------------------------ #
+
+    def save_config(self) -> None:
+        """Writes are committed per guild as they happen, so there is nothing to save"""
+
+    def flush(self) -> None:
+        """Writes are committed per guild as they happen, so there is nothing to flush"""
+
+    def _store_server(self, guild_str: str, server_config: Dict) -> None:
+        with self._lock:
+            self._write_server(guild_str, server_config)
+            self._conn.commit()
+            self._cache[guild_str] = server_config
+
+    def get_server_config(self, guild_id: int) -> Dict:
+        """Get configuration for a specific server"""
+        guild_str = str(guild_id)
+        with self._lock:
+            server_config = self._cache.get(guild_str)
+            if server_config is None:
+                server_config = self._read_server(guild_str)
+                if server_config is None:
+                    # Create default config for new server
+                    server_config = self.default_menu_config.copy()
+                    self._write_server(guild_str, server_config)
+                    self._conn.commit()
+                self._cache[guild_str] = server_config
+            return server_config
+
+    def list_servers(self) -> Dict:
+        """List all configured servers"""
+        with self._lock:
+            guild_ids = [row[0] for row in self._conn.execute("SELECT guild_id FROM guild_config")]
+        # get_server_config keys on str(guild_id), so odd keys (e.g. "None" from a DM) can't break the listing
+        return {g: self.get_server_config(g) for g in guild_ids}
+
+    def list_daily_servers(self) -> Dict:
+        """List the servers that have a daily posting channel set (uses the partial index)"""
+        with self._lock:
+            guild_ids = [row[0] for row in self._conn.execute(
+                "SELECT guild_id FROM guild_config WHERE daily_channel_id IS NOT NULL"
+            )]
+        return {g: self.get_server_config(g) for g in guild_ids}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
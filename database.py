@@ -1,89 +1,323 @@
+import asyncio
+import functools
+import hashlib
 import sqlite3
 import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Optional, Dict
 
+from menu_model import WeekMenu
+
+
+def _menu_json(menu) -> dict:
+    # Rows migrated from older versions are still plain legacy-shaped dicts
+    return menu.to_json() if isinstance(menu, WeekMenu) else (menu or {})
+
+
+def _encode_menu_snapshot(menu_data: Optional[WeekMenu], all_menus_data: Optional[Dict]) -> Tuple[str, str]:
+    """Serialise a view's menu content and return (hash, payload)"""
+    # Key order is meaningful (source order), so the payload is hashed as-is, not sorted
+    if all_menus_data is not None:
+        content = {'all_menus_data': {name: _menu_json(menu) for name, menu in all_menus_data.items()}}
+    else:
+        content = {'menu_data': _menu_json(menu_data)}
+    payload = json.dumps(content, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest(), payload
+
+
 class ButtonDatabase:
-    """Database handler for persistent button storage"""
-    
-    def __init__(self, db_path: str = "config/bot_data.db"):
+    """Database handler for persistent button storage.
+
+    Holds one long-lived WAL-mode connection. The *_async methods run the
+    blocking calls on a dedicated single-thread executor so they never
+    stall the event loop.
+
+    Menu payloads are stored once per distinct content in menu_snapshots,
+    keyed by their SHA-256 hash. Message rows only reference the hash, and
+    snapshots are reference-counted and deleted once no message uses them.
+
+    Day/source changes from navigation clicks go through a write-behind
+    queue: only the latest state per message is kept in memory and written
+    in one batched transaction by flush_menu_states().
+
+    Decoded views are kept in a bounded LRU cache keyed by message_id. It is
+    written through by saves and state updates, and invalidated by deletes
+    and cleanup, so hot messages never hit SQLite or json.loads.
+    """
+
+    def __init__(self, db_path: str = "config/bot_data.db", view_cache_size: int = 512):
         self.db_path = db_path
+        self.view_cache_size = view_cache_size
+        self._view_cache: "OrderedDict[int, Dict]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="button-db")
+        self._pending_states: Dict[int, Tuple[int, int]] = {}  # message_id -> (current_day, current_source)
+        self._pending_lock = threading.Lock()
+        self._conn = self._connect()
         self.init_db()
-    
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the shared connection with WAL journaling and a busy timeout"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # Only takes effect here for a brand-new file
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # Durable with WAL, without an fsync per commit
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking database call on the database executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
     def init_db(self):
         """Initialize the database with required tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create table for storing persistent menu views
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS persistent_menus (
-                message_id INTEGER PRIMARY KEY,
-                guild_id INTEGER NOT NULL,
-                channel_id INTEGER NOT NULL,
-                menu_data TEXT NOT NULL,
-                current_day INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                all_menus_json TEXT,
-                current_source INTEGER DEFAULT 0
-            )
-        ''')
-
-        # Migrate: add new columns to existing databases that don't have them yet
-        existing_columns = [row[1] for row in cursor.execute("PRAGMA table_info(persistent_menus)").fetchall()]
-        if "all_menus_json" not in existing_columns:
-            cursor.execute("ALTER TABLE persistent_menus ADD COLUMN all_menus_json TEXT")
-            print("Database migrated: added all_menus_json column")
-        if "current_source" not in existing_columns:
-            cursor.execute("ALTER TABLE persistent_menus ADD COLUMN current_source INTEGER DEFAULT 0")
-            print("Database migrated: added current_source column")
-        
-        conn.commit()
-        conn.close()
+        with self._lock:
+            cursor = self._conn.cursor()
+
+            # Incremental auto-vacuum lets cleanup hand freed pages back to the filesystem.
+            # New files get it in _connect; existing databases need a one-time VACUUM to switch.
+            if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                cursor.execute("VACUUM")
+                print("Database migrated: enabled incremental auto-vacuum")
+
+            # Create table for storing persistent menu views
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS persistent_menus (
+                    message_id INTEGER PRIMARY KEY,
+                    guild_id INTEGER NOT NULL,
+                    channel_id INTEGER NOT NULL,
+                    menu_data TEXT NOT NULL,
+                    current_day INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    all_menus_json TEXT,
+                    current_source INTEGER DEFAULT 0,
+                    snapshot_hash TEXT
+                )
+            ''')
+
+            # Content-addressed menu payloads shared by every message that shows the same data
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS menu_snapshots (
+                    snapshot_hash TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    ref_count INTEGER NOT NULL DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            # Migrate: add new columns to existing databases that don't have them yet
+            existing_columns = [row[1] for row in cursor.execute("PRAGMA table_info(persistent_menus)").fetchall()]
+            if "all_menus_json" not in existing_columns:
+                cursor.execute("ALTER TABLE persistent_menus ADD COLUMN all_menus_json TEXT")
+                print("Database migrated: added all_menus_json column")
+            if "current_source" not in existing_columns:
+                cursor.execute("ALTER TABLE persistent_menus ADD COLUMN current_source INTEGER DEFAULT 0")
+                print("Database migrated: added current_source column")
+            if "snapshot_hash" not in existing_columns:
+                cursor.execute("ALTER TABLE persistent_menus ADD COLUMN snapshot_hash TEXT")
+                print("Database migrated: added snapshot_hash column")
+
+            # Cleanup filters on created_at; per-guild lookups use guild_id
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_persistent_menus_created_at ON persistent_menus(created_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_persistent_menus_guild_id ON persistent_menus(guild_id)")
+
+            self._migrate_inline_payloads(cursor)
+            self._conn.commit()
         print("Database initialized successfully")
-    
+
+    def _migrate_inline_payloads(self, cursor: sqlite3.Cursor):
+        """Move the per-row JSON copies written by older versions into menu_snapshots"""
+        rows = cursor.execute('''
+            SELECT message_id, menu_data, all_menus_json
+            FROM persistent_menus
+            WHERE snapshot_hash IS NULL
+        ''').fetchall()
+
+        for message_id, menu_json, all_menus_json in rows:
+            menu_data = json.loads(menu_json) if menu_json else {}
+            all_menus_data = json.loads(all_menus_json) if all_menus_json else None
+            snapshot_hash = self._store_snapshot(cursor, menu_data, all_menus_data)
+            cursor.execute('''
+                UPDATE persistent_menus
+                SET snapshot_hash = ?, menu_data = '', all_menus_json = NULL
+                WHERE message_id = ?
+            ''', (snapshot_hash, message_id))
+
+        if rows:
+            print(f"Database migrated: moved {len(rows)} menu view(s) to shared snapshots")
+
+    # ------------------------------------------------------------------ #
+    #  Snapshot helpers (caller holds the lock)                            #
+    # ------------------------------------------------------------------ #
+
+    @staticmethod
+    def _select_menu(menu_data: Optional[WeekMenu], all_menus_data: Optional[Dict], current_source: int) -> WeekMenu:
+        """Return the active menu for the selected source"""
+        if all_menus_data:
+            sources = list(all_menus_data.keys())
+            return all_menus_data[sources[current_source % len(sources)]]
+        return menu_data or WeekMenu()
+
+    @staticmethod
+    def _load_snapshot(payload: str) -> Tuple[Optional[WeekMenu], Optional[Dict]]:
+        """Return (menu_data, all_menus_data) as WeekMenu objects for a snapshot payload"""
+        content = json.loads(payload)
+        all_menus_json = content.get('all_menus_data')
+        if all_menus_json is not None:
+            return None, {name: WeekMenu.from_json(menu) for name, menu in all_menus_json.items()}
+        return WeekMenu.from_json(content.get('menu_data') or {}), None
+
+    @classmethod
+    def _decode_snapshot(cls, payload: str, current_source: int) -> Tuple[WeekMenu, Optional[Dict]]:
+        """Return (menu_data, all_menus_data) for a snapshot payload and the selected source"""
+        menu_data, all_menus_data = cls._load_snapshot(payload)
+        return cls._select_menu(menu_data, all_menus_data, current_source), all_menus_data
+
+    def _store_snapshot(self, cursor: sqlite3.Cursor, menu_data, all_menus_data: Optional[Dict]) -> str:
+        """Insert the snapshot if it is new and take a reference to it"""
+        snapshot_hash, payload = _encode_menu_snapshot(menu_data, all_menus_data)
+        cursor.execute(
+            'INSERT OR IGNORE INTO menu_snapshots (snapshot_hash, payload, ref_count) VALUES (?, ?, 0)',
+            (snapshot_hash, payload),
+        )
+        cursor.execute('UPDATE menu_snapshots SET ref_count = ref_count + 1 WHERE snapshot_hash = ?', (snapshot_hash,))
+        return snapshot_hash
+
+    def _release_snapshot(self, cursor: sqlite3.Cursor, snapshot_hash: Optional[str], count: int = 1):
+        """Drop references to a snapshot and delete it once nothing uses it"""
+        if not snapshot_hash:
+            return
+        cursor.execute('UPDATE menu_snapshots SET ref_count = ref_count - ? WHERE snapshot_hash = ?', (count, snapshot_hash))
+        cursor.execute('DELETE FROM menu_snapshots WHERE snapshot_hash = ? AND ref_count <= 0', (snapshot_hash,))
+
+    # ------------------------------------------------------------------ #
+    #  Decoded view cache                                                  #
+    # ------------------------------------------------------------------ #
+
+    def _cache_view(self, message_id: int, entry: Dict):
+        """Insert or refresh a decoded view, evicting the least recently used ones"""
+        with self._cache_lock:
+            self._view_cache[message_id] = entry
+            self._view_cache.move_to_end(message_id)
+            while len(self._view_cache) > self.view_cache_size:
+                self._view_cache.popitem(last=False)
+
+    def _cache_state(self, message_id: int, current_day: int, current_source: int):
+        """Apply a day/source change to a cached view, if it is cached"""
+        with self._cache_lock:
+            entry = self._view_cache.get(message_id)
+            if entry is not None:
+                entry['current_day'] = current_day
+                entry['current_source'] = current_source
+
+    def _invalidate_views(self, message_ids):
+        with self._cache_lock:
+            for message_id in message_ids:
+                self._view_cache.pop(message_id, None)
+
+    def view_cache_stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the current size of the decoded view cache"""
+        with self._cache_lock:
+            size = len(self._view_cache)
+        return {'hits': self.cache_hits, 'misses': self.cache_misses, 'size': size}
+
+    # ------------------------------------------------------------------ #
+    #  Menu views                                                          #
+    # ------------------------------------------------------------------ #
+
     def save_menu_view(self, message_id: int, guild_id: int, channel_id: int,
-                       menu_data: dict, current_day: int = 0,
+                       menu_data: WeekMenu, current_day: int = 0,
                        all_menus_data: Optional[Dict] = None, current_source: int = 0):
         """Save a persistent menu view to the database.
-        
-        all_menus_data: dict of {source_name: {day: {category: [items]}}} for multi-source views.
+
+        all_menus_data: dict of {source_name: WeekMenu} for multi-source views.
         current_source: index of the currently-selected source.
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        menu_json = json.dumps(menu_data)
-        all_menus_json = json.dumps(all_menus_data) if all_menus_data is not None else None
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO persistent_menus 
-            (message_id, guild_id, channel_id, menu_data, current_day, all_menus_json, current_source)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (message_id, guild_id, channel_id, menu_json, current_day, all_menus_json, current_source))
-        
-        conn.commit()
-        conn.close()
+        # A full save supersedes any queued state for this message
+        with self._pending_lock:
+            self._pending_states.pop(message_id, None)
+
+        with self._lock:
+            cursor = self._conn.cursor()
+            row = cursor.execute('SELECT snapshot_hash FROM persistent_menus WHERE message_id = ?', (message_id,)).fetchone()
+            old_hash = row[0] if row else None
+
+            # Take the new reference before releasing the old one so an unchanged snapshot is never deleted
+            snapshot_hash = self._store_snapshot(cursor, menu_data, all_menus_data)
+            cursor.execute('''
+                INSERT OR REPLACE INTO persistent_menus
+                (message_id, guild_id, channel_id, menu_data, current_day, all_menus_json, current_source, snapshot_hash)
+                VALUES (?, ?, ?, '', ?, NULL, ?, ?)
+            ''', (message_id, guild_id, channel_id, current_day, current_source, snapshot_hash))
+            self._release_snapshot(cursor, old_hash)
+            self._conn.commit()
+
+        self._cache_view(message_id, {
+            'guild_id': guild_id,
+            'channel_id': channel_id,
+            'menu_data': menu_data,
+            'current_day': current_day,
+            'all_menus_data': all_menus_data,
+            'current_source': current_source,
+        })
         print(f"Saved persistent menu view for message {message_id}")
-    
+
+    def queue_menu_state(self, message_id: int, current_day: int, current_source: int = 0):
+        """Queue a day/source change for the next batched flush (no I/O, safe to call from the event loop)"""
+        with self._pending_lock:
+            self._pending_states[message_id] = (current_day, current_source)
+        self._cache_state(message_id, current_day, current_source)
+
+    def flush_menu_states(self) -> int:
+        """Write every queued state change in a single transaction. Returns the number of messages written."""
+        with self._pending_lock:
+            pending, self._pending_states = self._pending_states, {}
+
+        if not pending:
+            return 0
+
+        with self._lock:
+            self._conn.executemany(
+                'UPDATE persistent_menus SET current_day = ?, current_source = ? WHERE message_id = ?',
+                [(day, source, message_id) for message_id, (day, source) in pending.items()],
+            )
+            self._conn.commit()
+        return len(pending)
+
     def get_menu_view(self, message_id: int) -> Optional[Dict]:
-        """Retrieve a menu view from the database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT guild_id, channel_id, menu_data, current_day, all_menus_json, current_source
-            FROM persistent_menus 
-            WHERE message_id = ?
-        ''', (message_id,))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            guild_id, channel_id, menu_json, current_day, all_menus_json, current_source = result
-            menu_data = json.loads(menu_json)
-            all_menus_data = json.loads(all_menus_json) if all_menus_json else None
-            return {
+        """Retrieve a menu view, from the decoded view cache when possible"""
+        with self._cache_lock:
+            entry = self._view_cache.get(message_id)
+            if entry is not None:
+                self._view_cache.move_to_end(message_id)
+                self.cache_hits += 1
+                entry = dict(entry)
+            else:
+                self.cache_misses += 1
+
+        if entry is None:
+            with self._lock:
+                result = self._conn.execute('''
+                    SELECT p.guild_id, p.channel_id, p.current_day, p.current_source, s.payload
+                    FROM persistent_menus p
+                    JOIN menu_snapshots s ON s.snapshot_hash = p.snapshot_hash
+                    WHERE p.message_id = ?
+                ''', (message_id,)).fetchone()
+
+            if not result:
+                return None
+
+            guild_id, channel_id, current_day, current_source, payload = result
+            menu_data, all_menus_data = self._load_snapshot(payload)
+            entry = {
                 'guild_id': guild_id,
                 'channel_id': channel_id,
                 'menu_data': menu_data,
@@ -91,23 +325,35 @@ class ButtonDatabase:
                 'all_menus_data': all_menus_data,
                 'current_source': current_source or 0,
             }
-        return None
-    
+            self._cache_view(message_id, dict(entry))
+
+        # Queued state that hasn't been flushed yet is newer than the row
+        with self._pending_lock:
+            pending = self._pending_states.get(message_id)
+        if pending:
+            entry['current_day'], entry['current_source'] = pending
+
+        entry['menu_data'] = self._select_menu(entry['menu_data'], entry['all_menus_data'], entry['current_source'])
+        return entry
+
     def get_all_persistent_menus(self) -> List[Tuple[int, Dict]]:
         """Get all persistent menus for bot startup"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT message_id, guild_id, channel_id, menu_data, current_day, all_menus_json, current_source
-            FROM persistent_menus
-        ''')
-        
+        self.flush_menu_states()
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT p.message_id, p.guild_id, p.channel_id, p.current_day, p.current_source, s.snapshot_hash, s.payload
+                FROM persistent_menus p
+                JOIN menu_snapshots s ON s.snapshot_hash = p.snapshot_hash
+            ''').fetchall()
+
         results = []
-        for row in cursor.fetchall():
-            message_id, guild_id, channel_id, menu_json, current_day, all_menus_json, current_source = row
-            menu_data = json.loads(menu_json)
-            all_menus_data = json.loads(all_menus_json) if all_menus_json else None
+        decoded: Dict[Tuple[str, int], Tuple[WeekMenu, Optional[Dict]]] = {}  # Each shared snapshot is parsed once
+        for row in rows:
+            message_id, guild_id, channel_id, current_day, current_source, snapshot_hash, payload = row
+            key = (snapshot_hash, current_source or 0)
+            if key not in decoded:
+                decoded[key] = self._decode_snapshot(payload, current_source or 0)
+            menu_data, all_menus_data = decoded[key]
             results.append((message_id, {
                 'guild_id': guild_id,
                 'channel_id': channel_id,
@@ -116,33 +362,127 @@ class ButtonDatabase:
                 'all_menus_data': all_menus_data,
                 'current_source': current_source or 0,
             }))
-        
-        conn.close()
+
         return results
-    
+
     def delete_menu_view(self, message_id: int):
         """Delete a menu view from the database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM persistent_menus WHERE message_id = ?', (message_id,))
-        
-        conn.commit()
-        conn.close()
+        with self._pending_lock:
+            self._pending_states.pop(message_id, None)
+        self._invalidate_views([message_id])
+
+        with self._lock:
+            cursor = self._conn.cursor()
+            row = cursor.execute('SELECT snapshot_hash FROM persistent_menus WHERE message_id = ?', (message_id,)).fetchone()
+            cursor.execute('DELETE FROM persistent_menus WHERE message_id = ?', (message_id,))
+            if row:
+                self._release_snapshot(cursor, row[0])
+            self._conn.commit()
         print(f"Deleted menu view for message {message_id}")
-    
-    def cleanup_old_menus(self, days: int = 7):
-        """Remove menu views older than specified days"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            DELETE FROM persistent_menus 
-            WHERE created_at < datetime('now', '-' || ? || ' days')
-        ''', (days,))
-        
-        deleted = cursor.rowcount
-        conn.commit()
-        conn.close()
-        print(f"Cleaned up {deleted} old menu views")
-        return deleted
+
+    def _delete_old_batch(self, days: int, batch_size: int) -> int:
+        """Delete up to batch_size views older than days in one short transaction. Returns rows deleted."""
+        with self._lock:
+            cursor = self._conn.cursor()
+            rows = cursor.execute('''
+                SELECT message_id, snapshot_hash
+                FROM persistent_menus
+                WHERE created_at < datetime('now', '-' || ? || ' days')
+                ORDER BY created_at
+                LIMIT ?
+            ''', (days, batch_size)).fetchall()
+
+            if not rows:
+                return 0
+
+            message_ids = [message_id for message_id, _ in rows]
+            cursor.executemany('DELETE FROM persistent_menus WHERE message_id = ?', [(m,) for m in message_ids])
+
+            released: Dict[str, int] = {}
+            for _, snapshot_hash in rows:
+                released[snapshot_hash] = released.get(snapshot_hash, 0) + 1
+            for snapshot_hash, count in released.items():
+                self._release_snapshot(cursor, snapshot_hash, count)
+            self._conn.commit()
+
+        self._invalidate_views(message_ids)
+        return len(message_ids)
+
+    def _reclaim_space(self):
+        """Return free pages to the filesystem and fold the WAL back into the main file"""
+        with self._lock:
+            # executescript steps the pragma to completion; a plain execute() frees a single page
+            self._conn.executescript("PRAGMA incremental_vacuum;")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    def database_size(self) -> int:
+        """Size of the database file (plus any WAL) in bytes"""
+        size = 0
+        for path in (self.db_path, self.db_path + "-wal"):
+            if os.path.exists(path):
+                size += os.path.getsize(path)
+        return size
+
+    def cleanup_old_menus(self, days: int = 7, batch_size: int = 500) -> Dict[str, int]:
+        """Remove menu views older than specified days in bounded batches, then shrink the file.
+
+        Returns {'deleted', 'size_before', 'size_after'} with sizes in bytes.
+        """
+        size_before = self.database_size()
+        deleted = 0
+        while True:
+            batch = self._delete_old_batch(days, batch_size)
+            deleted += batch
+            if batch < batch_size:
+                break
+        self._reclaim_space()
+        return self._cleanup_report(deleted, size_before)
+
+    def _cleanup_report(self, deleted: int, size_before: int) -> Dict[str, int]:
+        size_after = self.database_size()
+        print(f"Cleaned up {deleted} old menu views (database {size_before} -> {size_after} bytes)")
+        return {'deleted': deleted, 'size_before': size_before, 'size_after': size_after}
+
+    def close(self):
+        """Flush queued state, close the shared connection and stop the database executor"""
+        self._executor.shutdown(wait=True)
+        flushed = self.flush_menu_states()
+        if flushed:
+            print(f"Flushed {flushed} queued menu state(s) on shutdown")
+        with self._lock:
+            self._conn.close()
+        print("Database connection closed")
+
+    # ------------------------------------------------------------------ #
+    #  Awaitable equivalents (run on the database executor)                #
+    # ------------------------------------------------------------------ #
+
+    async def save_menu_view_async(self, message_id: int, guild_id: int, channel_id: int,
+                                   menu_data: WeekMenu, current_day: int = 0,
+                                   all_menus_data: Optional[Dict] = None, current_source: int = 0):
+        return await self._run(self.save_menu_view, message_id, guild_id, channel_id,
+                               menu_data, current_day, all_menus_data, current_source)
+
+    async def flush_menu_states_async(self) -> int:
+        return await self._run(self.flush_menu_states)
+
+    async def get_menu_view_async(self, message_id: int) -> Optional[Dict]:
+        return await self._run(self.get_menu_view, message_id)
+
+    async def get_all_persistent_menus_async(self) -> List[Tuple[int, Dict]]:
+        return await self._run(self.get_all_persistent_menus)
+
+    async def delete_menu_view_async(self, message_id: int):
+        return await self._run(self.delete_menu_view, message_id)
+
+    async def cleanup_old_menus_async(self, days: int = 7, batch_size: int = 500) -> Dict[str, int]:
+        # Each batch is its own executor job, so clicks queued behind the cleanup run in between
+        size_before = await self._run(self.database_size)
+        deleted = 0
+        while True:
+            batch = await self._run(self._delete_old_batch, days, batch_size)
+            deleted += batch
+            if batch < batch_size:
+                break
+        await self._run(self._reclaim_space)
+        return await self._run(self._cleanup_report, deleted, size_before)
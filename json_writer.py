@@ -0,0 +1,80 @@
+"""
+Debounced, atomic JSON file writes shared by the config and menu stores
+"""
+import asyncio
+import os
+import threading
+from typing import Callable, Optional
+
+
+class DebouncedJsonWriter:
+    """Writes a JSON document a while after it last changed, without blocking the event loop.
+
+    serialize() is called on the event loop thread (so it can't race a mutation) and returns
+    the document as a string. The write goes to a temp file that is fsynced and renamed over
+    the target, so a crash can never leave a truncated file.
+    """
+
+    def __init__(self, path: str, serialize: Callable[[], str], save_delay: float = 2.0, label: str = "file"):
+        self.path = path
+        self.serialize = serialize
+        self.save_delay = save_delay  # Changes within this window are written together
+        self.label = label
+        self._save_handle: Optional[asyncio.TimerHandle] = None
+        self._dirty = False
+        self._save_seq = 0  # Bumped per snapshot so an older write never overwrites a newer one
+        self._written_seq = 0
+        self._write_lock = threading.Lock()
+
+    def schedule(self) -> None:
+        """Mark the document changed and schedule a write.
+
+        Inside the event loop, changes are coalesced for save_delay seconds and
+        written off the loop. Without a running loop the file is written immediately.
+        """
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+
+        if self._save_handle is None:
+            self._save_handle = loop.call_later(self.save_delay, self._flush_in_background, loop)
+
+    def _snapshot(self) -> tuple:
+        self._dirty = False
+        self._save_seq += 1
+        return self._save_seq, self.serialize()
+
+    def _flush_in_background(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._save_handle = None
+        if self._dirty:
+            seq, payload = self._snapshot()
+            loop.run_in_executor(None, self._write_atomic, seq, payload)
+
+    def _write_atomic(self, seq: int, payload: str) -> None:
+        with self._write_lock:
+            if seq <= self._written_seq:
+                return  # A newer snapshot has already been written
+            try:
+                target_dir = os.path.dirname(self.path)
+                if target_dir:
+                    os.makedirs(target_dir, exist_ok=True)
+                tmp_file = f"{self.path}.tmp"
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.path)
+                self._written_seq = seq
+            except Exception as e:
+                print(f"Error saving {self.label}: {e}")
+
+    def flush(self) -> None:
+        """Write any pending changes right now (used on shutdown)"""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        if self._dirty:
+            self._write_atomic(*self._snapshot())
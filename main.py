@@ -1,36 +1,180 @@
 import discord
 from discord.ext import commands, tasks
 from discord import app_commands
-import aiohttp
 from datetime import datetime, time, date, timedelta
 import zoneinfo
 import os
+import asyncio
 from dotenv import load_dotenv
-from config import ServerConfig
+from config import MAX_HORIZON_DAYS, ServerConfig, SqliteServerConfig
 from database import ButtonDatabase
+from menu_cache import MenuCache, MenuStore, SingleFlight, ValidatorCache
+from menu_model import MenuDay, WeekMenu
+from upstream import CircuitOpenError, UpstreamClient, parse_host_rates
 
 # Load environment variables
 load_dotenv()
 
-# Initialize server configuration
-server_config = ServerConfig()
+# Menus, week boundaries and the daily jobs follow Finnish time, not the container's
+LOCAL_TZ = zoneinfo.ZoneInfo("Europe/Helsinki")
+
+def local_today() -> date:
+    """Today's date in Helsinki; past menu days are dropped and "today" is matched against this"""
+    return datetime.now(LOCAL_TZ).date()
+
+# Initialize server configuration ("json" keeps everything in server_config.json, "sqlite" stores one row per guild)
+CONFIG_BACKEND = os.getenv('CONFIG_BACKEND', 'json').lower()
+server_config = SqliteServerConfig() if CONFIG_BACKEND == 'sqlite' else ServerConfig()
 
 # Initialize database for persistent buttons
-button_db = ButtonDatabase()
+button_db = ButtonDatabase(view_cache_size=int(os.getenv('VIEW_CACHE_SIZE', '512')))
+
+# API configuration
+FOOD_API_KEY = os.getenv('FOOD_API_KEY')  # Add your API key to .env file
+
+# Pooled HTTP client shared by every upstream fetch (opened in setup_hook, closed on shutdown)
+http_client = UpstreamClient(
+    limit_per_host=int(os.getenv('HTTP_LIMIT_PER_HOST', '10')),
+    connect_timeout=float(os.getenv('HTTP_CONNECT_TIMEOUT', '5')),
+    read_timeout=float(os.getenv('HTTP_READ_TIMEOUT', '15')),
+    retries=int(os.getenv('HTTP_RETRIES', '2')),
+    backoff_base=float(os.getenv('HTTP_BACKOFF_BASE', '0.5')),
+    failure_threshold=int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5')),
+    reset_timeout=float(os.getenv('CIRCUIT_RESET_SECONDS', '60')),
+    # Global cap on concurrent upstream requests across all guilds and sources
+    max_concurrency=int(os.getenv('FETCH_CONCURRENCY', '8')),
+    # Token bucket per provider host, shared fairly between guilds; UPSTREAM_HOST_RATES overrides single hosts
+    rate=float(os.getenv('UPSTREAM_RATE_PER_SECOND', '2')),
+    burst=int(os.getenv('UPSTREAM_BURST', '5')),
+    host_rates=parse_host_rates(os.getenv('UPSTREAM_HOST_RATES', '')),
+)
+
+# Shared cache of parsed menus, keyed on the source URL so guilds with the same kitchen share one fetch
+MENU_CACHE_TTL_SECONDS = float(os.getenv('MENU_CACHE_TTL_SECONDS', '900'))
+MENU_CACHE_MAX_ENTRIES = int(os.getenv('MENU_CACHE_MAX_ENTRIES', '256'))
+menu_cache = MenuCache(ttl_seconds=MENU_CACHE_TTL_SECONDS, max_entries=MENU_CACHE_MAX_ENTRIES)
+menu_fetches = SingleFlight()  # coalesces concurrent fetches of the same source URL
+upstream_validators = ValidatorCache(max_entries=MENU_CACHE_MAX_ENTRIES)  # ETag/Last-Modified and body hash per source URL
+
+# Parsed menus persisted in config/ so the first interaction after a restart is answered from disk while revalidating
+MENU_STORE_MAX_STALE_SECONDS = float(os.getenv('MENU_STORE_MAX_STALE_SECONDS', str(3 * 24 * 3600)))
+menu_store = MenuStore(max_entries=MENU_CACHE_MAX_ENTRIES)
+background_refreshes: set = set()  # keeps revalidation tasks referenced until they finish
+
+# Every configured source is refreshed in the background this often (a source can set its own "refresh_minutes")
+MENU_REFRESH_MINUTES = float(os.getenv('MENU_REFRESH_MINUTES', '15'))
+next_source_refresh: dict = {}  # source URL -> timestamp of its next scheduled background refresh
+
+# Interactions wait at most this long for upstream; slower sources are shown from their last good copy
+INTERACTION_FETCH_BUDGET_SECONDS = float(os.getenv('INTERACTION_FETCH_BUDGET_SECONDS', '3'))
+STALE_NOTICE = "⚠️ Saved copy, the menu service could not be reached"  # covers timeouts and open circuits alike
+
+# From this weekday on (0 = Monday) weekly sources fetch next week together with the current one
+NEXT_WEEK_PREFETCH_WEEKDAY = int(os.getenv('NEXT_WEEK_PREFETCH_WEEKDAY', '4'))
+
+# Refresh clicks on the same message within this window reuse the result the first click fetched
+REFRESH_COOLDOWN_SECONDS = float(os.getenv('REFRESH_COOLDOWN_SECONDS', '30'))
+refresh_results = MenuCache(ttl_seconds=REFRESH_COOLDOWN_SECONDS, max_entries=1024)
+
+# Daily posting: how many guilds are processed at once, and the time budget for each guild
+DAILY_POST_CONCURRENCY = int(os.getenv('DAILY_POST_CONCURRENCY', '10'))
+DAILY_POST_GUILD_TIMEOUT = float(os.getenv('DAILY_POST_GUILD_TIMEOUT', '60'))
+
+# Daily posts are fetched and rendered this many minutes before 7:00 so publishing only sends messages
+DAILY_STAGE_LEAD_MINUTES = int(os.getenv('DAILY_STAGE_LEAD_MINUTES', '10'))
+DAILY_STAGE_TIME = (datetime.combine(date.today(), time(hour=7)) - timedelta(minutes=DAILY_STAGE_LEAD_MINUTES)).time().replace(
+    tzinfo=LOCAL_TZ
+)
+staged_daily_posts: dict = {}  # guild_id -> staged daily post payload
+
+# Navigation state is written behind; this bounds how stale the database can be after a crash
+MENU_STATE_FLUSH_SECONDS = float(os.getenv('MENU_STATE_FLUSH_SECONDS', '2'))
+
+# Pre-rendered embed bodies keyed by (source menu content hash, day index, title); content-addressed, so they never go stale
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv('EMBED_CACHE_MAX_ENTRIES', '1024'))
+rendered_embeds = MenuCache(ttl_seconds=24 * 3600, max_entries=EMBED_CACHE_MAX_ENTRIES)
+
+class MenuBot(commands.Bot):
+    """Bot that owns the lifecycle of the shared HTTP session, the database connection and config writes"""
+
+    async def setup_hook(self):
+        await http_client.start()
+
+    async def close(self):
+        # Every step runs even if an earlier one fails, so pending writes are never skipped
+        try:
+            await http_client.close()
+        except Exception as e:
+            print(f"Error closing upstream HTTP session: {e}")
+        try:
+            await super().close()
+        except Exception as e:
+            print(f"Error closing Discord connection: {e}")
+
+        for description, step in (
+            ("closing button database", button_db.close),
+            ("flushing server config", server_config.flush),
+            ("closing server config", server_config.close),
+            ("flushing menu store", menu_store.flush),
+        ):
+            try:
+                step()
+            except Exception as e:
+                print(f"Error {description}: {e}")
 
 # Bot configuration
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix='!', intents=intents)
+bot = MenuBot(command_prefix='!', intents=intents)
+
+# ------------------------------------------------------------------ #
+#  Embed rendering                                                     #
+# ------------------------------------------------------------------ #
+
+def _render_embed_body(day: MenuDay, title: str) -> dict:
+    """Build the static part of a menu embed as a Discord embed payload"""
+    fields = [
+        {"name": f"**{category.name}**", "value": "\n".join([f"• {item}" for item in category.items]), "inline": False}
+        for category in day.categories
+        if category.items
+    ]
+    return {"type": "rich", "title": title, "color": 0x00ff00, "fields": fields}
+
+def render_menu_embed(active_menu: WeekMenu, day_index: int, source_name: str = "",
+                      multi_source: bool = False) -> discord.Embed:
+    """Return the embed for one day of one source.
+
+    The title and fields are rendered once per (menu content, day, title) and reused;
+    callers only set the volatile parts (footer, description) on the returned embed.
+    """
+    days = active_menu.days if active_menu else ()
+    if not days:
+        return discord.Embed(title="No Menu Available", color=0xff0000)
+
+    day_index %= len(days)
+    day = days[day_index]
+    if source_name and multi_source:
+        title = f"🍽️ {source_name} — {day.label}"
+    else:
+        title = f"🍽️ Ruokalista — {day.label}"
 
-# API configuration
-FOOD_API_KEY = os.getenv('FOOD_API_KEY')  # Add your API key to .env file
+    # The per-source WeekMenu is shared from the menu cache, so its hash is only computed once
+    key = (active_menu.content_hash, day_index, title)
+    body = rendered_embeds.get(key)
+    if body is None:
+        body = _render_embed_body(day, title)
+        rendered_embeds.set(key, body)
+
+    # Copy the field list so per-response add_field calls never touch the cached payload
+    embed = discord.Embed.from_dict({**body, "fields": list(body["fields"])})
+    embed.timestamp = datetime.now()
+    return embed
 
 class MenuView(discord.ui.View):
     """Interactive view for switching between menu days (and optionally between sources)"""
     
     def __init__(self, menu_data, current_day=0, guild_id=None, persistent=True, message_id=None,
-                 all_menus_data=None, current_source=0):
+                 all_menus_data=None, current_source=0, stale_sources=None, language=None):
         # Use no timeout for daily messages (persistent), 15 minutes for user commands
         timeout = None if persistent else 900  # 15 minutes for user interactions
         super().__init__(timeout=timeout)
@@ -39,9 +183,11 @@ class MenuView(discord.ui.View):
         self.message_id = message_id  # Store message_id for database updates
 
         # Multi-source support
-        self.all_menus_data = all_menus_data  # {source_name: {day: {cat: [items]}}} | None
+        self.all_menus_data = all_menus_data  # {source_name: WeekMenu} | None
         self.current_source = current_source
         self.sources: list = list(all_menus_data.keys()) if all_menus_data else []
+        self.stale_sources = frozenset(stale_sources or ())  # sources shown from their last good copy
+        self.language = language  # language picked with /menu, kept when the menu is refreshed
 
         # Derive active menu_data from current source (or use the passed-in single-source data)
         if all_menus_data and self.sources:
@@ -51,7 +197,7 @@ class MenuView(discord.ui.View):
             self.menu_data = menu_data
 
         self.current_day = current_day
-        self.days = list(self.menu_data.keys()) if self.menu_data else []
+        self.days = self.menu_data.days if self.menu_data else ()
 
         # Dynamically add a source-selector dropdown when there are multiple sources
         if all_menus_data and len(all_menus_data) > 1:
@@ -82,17 +228,9 @@ class MenuView(discord.ui.View):
             return self.sources[self.current_source]
         return ""
 
-    def _save_to_db(self, message_id: int, channel_id: int):
-        """Persist the current view state to the database."""
-        button_db.save_menu_view(
-            message_id,
-            self.guild_id,
-            channel_id,
-            self.menu_data,
-            self.current_day,
-            self.all_menus_data,
-            self.current_source,
-        )
+    def _save_state_to_db(self, message_id: int):
+        """Queue the current day/source selection for the next database flush (menu content is unchanged)."""
+        button_db.queue_menu_state(message_id, self.current_day, self.current_source)
 
     async def _select_source_callback(self, interaction: discord.Interaction):
         """Called when the user picks a different source from the dropdown."""
@@ -106,7 +244,7 @@ class MenuView(discord.ui.View):
             self.current_source = source_idx
             src_name = self.sources[source_idx]
             self.menu_data = self.all_menus_data[src_name]
-            self.days = list(self.menu_data.keys())
+            self.days = self.menu_data.days
             self.current_day = 0
 
             # Update the Select to reflect the new default
@@ -118,7 +256,7 @@ class MenuView(discord.ui.View):
 
             embed = self.create_menu_embed()
             if self.persistent and self.message_id and interaction.channel_id:
-                self._save_to_db(self.message_id, interaction.channel_id)
+                self._save_state_to_db(self.message_id)
             await interaction.response.edit_message(embed=embed, view=self)
         else:
             user_view = MenuView(
@@ -128,6 +266,8 @@ class MenuView(discord.ui.View):
                 persistent=False,
                 all_menus_data=self.all_menus_data,
                 current_source=source_idx,
+                stale_sources=self.stale_sources,
+                language=self.language,
             )
             embed = user_view.create_menu_embed()
             await interaction.response.send_message(embed=embed, view=user_view, ephemeral=True)
@@ -147,7 +287,7 @@ class MenuView(discord.ui.View):
 
             # Update database if this is a persistent view
             if self.persistent and self.message_id and interaction.guild and interaction.channel_id:
-                self._save_to_db(self.message_id, interaction.channel_id)
+                self._save_state_to_db(self.message_id)
 
             await interaction.response.edit_message(embed=embed, view=self)
         else:
@@ -159,6 +299,8 @@ class MenuView(discord.ui.View):
                 persistent=False,
                 all_menus_data=self.all_menus_data,
                 current_source=self.current_source,
+                stale_sources=self.stale_sources,
+                language=self.language,
             )
             embed = user_view.create_menu_embed()
             await interaction.response.send_message(embed=embed, view=user_view, ephemeral=True)
@@ -174,7 +316,7 @@ class MenuView(discord.ui.View):
 
             # Update database if this is a persistent view
             if self.persistent and self.message_id and interaction.guild and interaction.channel_id:
-                self._save_to_db(self.message_id, interaction.channel_id)
+                self._save_state_to_db(self.message_id)
 
             await interaction.response.edit_message(embed=embed, view=self)
         else:
@@ -186,6 +328,8 @@ class MenuView(discord.ui.View):
                 persistent=False,
                 all_menus_data=self.all_menus_data,
                 current_source=self.current_source,
+                stale_sources=self.stale_sources,
+                language=self.language,
             )
             embed = user_view.create_menu_embed()
             await interaction.response.send_message(embed=embed, view=user_view, ephemeral=True)
@@ -200,7 +344,9 @@ class MenuView(discord.ui.View):
         
         if is_ephemeral:
             await interaction.response.defer()
-            new_all_menus = await fetch_all_menus_data(guild_id)
+            stale = set()
+            new_all_menus = await refresh_menus_for_message(guild_id, interaction.message.id if interaction.message else None, stale,
+                                                           self.language)
             if new_all_menus:
                 # Preserve source selection if available
                 new_source = 0
@@ -211,7 +357,8 @@ class MenuView(discord.ui.View):
                 new_view = MenuView(
                     menu_data=None, current_day=0, guild_id=guild_id,
                     persistent=self.persistent, message_id=self.message_id,
-                    all_menus_data=new_all_menus, current_source=new_source,
+                    all_menus_data=new_all_menus, current_source=new_source, stale_sources=stale,
+                    language=self.language,
                 )
                 embed = new_view.create_menu_embed()
                 await interaction.edit_original_response(embed=embed, view=new_view)
@@ -219,11 +366,14 @@ class MenuView(discord.ui.View):
                 await interaction.edit_original_response(content="❌ Failed to refresh menu data.")
         else:
             await interaction.response.defer(ephemeral=True)
-            new_all_menus = await fetch_all_menus_data(guild_id)
+            stale = set()
+            new_all_menus = await refresh_menus_for_message(guild_id, interaction.message.id if interaction.message else None, stale,
+                                                           self.language)
             if new_all_menus:
                 user_view = MenuView(
                     menu_data=None, current_day=0, guild_id=guild_id, persistent=False,
-                    all_menus_data=new_all_menus, current_source=0,
+                    all_menus_data=new_all_menus, current_source=0, stale_sources=stale,
+                    language=self.language,
                 )
                 embed = user_view.create_menu_embed()
                 await interaction.followup.send(embed=embed, view=user_view, ephemeral=True)
@@ -238,32 +388,17 @@ class MenuView(discord.ui.View):
         """Create an embed for the current day's menu"""
         if not self.days:
             return discord.Embed(title="No Menu Available", color=0xff0000)
-        
-        current_day_name = self.days[self.current_day]
-        day_menu = self.menu_data[current_day_name]
 
         # Include source name in title when there are multiple sources
-        source_name = self._current_source_name()
-        if source_name and len(self.sources) > 1:
-            title = f"🍽️ {source_name} — {current_day_name}"
-        else:
-            title = f"🍽️ Ruokalista — {current_day_name}"
-        
-        embed = discord.Embed(
-            title=title,
-            color=0x00ff00,
-            timestamp=datetime.now()
+        embed = render_menu_embed(
+            self.menu_data, self.current_day, self._current_source_name(), len(self.sources) > 1,
         )
-        
-        # Add menu items by category
-        for category, items in day_menu.items():
-            if items:
-                items_text = "\n".join([f"• {item}" for item in items])
-                embed.add_field(name=f"**{category}**", value=items_text, inline=False)
-        
+
         footer_text = f"Day {self.current_day + 1} of {len(self.days)} | Click buttons to navigate"
         if not self.persistent:
             footer_text += " (personal view)"
+        if self._current_source_name() in self.stale_sources:
+            footer_text += f"\n{STALE_NOTICE}"
         embed.set_footer(text=footer_text)
         
         return embed
@@ -275,15 +410,34 @@ class MenuView(discord.ui.View):
             if isinstance(item, discord.ui.Button):
                 item.disabled = True
 
+def _mealdoo_localized(entries, language):
+    """Return the entry for language from a Mealdoo names/diets list, falling back to Finnish"""
+    by_language = {entry.get('language'): entry for entry in entries}
+    return by_language.get(language) or by_language.get('fi')
+
 def parse_mealdoo_data(mealdoo_data):
-    """Parse Mealdoo API data into a format suitable for the Discord bot"""
-    parsed_data = {}
+    """Parse Mealdoo API data into a WeekMenu.
+
+    Mealdoo returns every language in one response; Finnish becomes the menu itself
+    and the other languages its translations, so any of them can be shown without another fetch.
+    """
+    languages = {}
     
     if not mealdoo_data or not isinstance(mealdoo_data, list):
-        return parsed_data
+        return WeekMenu()
     
     # Get today's date for filtering
-    today = datetime.now().date()
+    today = local_today()
+
+    # Every language that names at least one meal option or dish, in the order the response first uses them
+    available = list(dict.fromkeys(
+        name_obj.get('language')
+        for day_data in mealdoo_data if isinstance(day_data, dict)
+        for meal_option in (day_data.get('data') or {}).get('mealOptions', [])
+        for entry in [meal_option, *meal_option.get('rows', [])]
+        for name_obj in entry.get('names', [])
+        if name_obj.get('language')
+    )) or ['fi']
     
     # Process each day in the data
     for day_data in mealdoo_data:
@@ -303,69 +457,59 @@ def parse_mealdoo_data(mealdoo_data):
                 print(f"Skipping past date: {day_obj}")
                 continue
             
-            day_name = day_obj.strftime("%A, %B %d")
-            
-            # Initialize the day's menu
-            parsed_data[day_name] = {}
-            
-            # Process meal options
             meal_options = day_data.get('data', {}).get('mealOptions', [])
-            for meal_option in meal_options:
-                # Get meal category name (e.g., "Lounas", "Kasvislounas")
-                meal_names = meal_option.get('names', [])
-                meal_name = 'Unknown'
-                for name_obj in meal_names:
-                    if name_obj.get('language') == 'fi':
-                        meal_name = name_obj.get('name', 'Unknown')
-                        break
-                
-                # Process rows (menu items)
-                items = []
-                rows = meal_option.get('rows', [])
-                for row in rows:
-                    # Get item name
-                    names = row.get('names', [])
-                    for name_obj in names:
-                        if name_obj.get('language') == 'fi':
-                            item_name = name_obj.get('name', '').strip()
-                            if item_name and item_name not in ['ESPANJA', '***']:  # Skip category headers
-                                # Get diet info if available
-                                diets_info = row.get('diets', [])
-                                diet_shorts = []
-                                for diet_obj in diets_info:
-                                    if diet_obj.get('language') == 'fi':
-                                        diet_shorts = diet_obj.get('dietShorts', [])
-                                        break
-                                
-                                # Format item with diet info
-                                if diet_shorts:
-                                    item_display = f"{item_name} ({', '.join(diet_shorts)})"
-                                else:
-                                    item_display = item_name
-                                
-                                items.append(item_display)
-                            break
-                
-                if items:  # Only add if there are actual items
-                    parsed_data[day_name][meal_name] = items
+            for language in available:
+                # Initialize the day's menu
+                parsed_data = languages.setdefault(language, {})
+                parsed_data[day_obj] = {}
+
+                # Process meal options
+                for meal_option in meal_options:
+                    # Get meal category name (e.g., "Lounas", "Kasvislounas")
+                    name_obj = _mealdoo_localized(meal_option.get('names', []), language)
+                    meal_name = name_obj.get('name', 'Unknown') if name_obj else 'Unknown'
+
+                    # Process rows (menu items)
+                    items = []
+                    for row in meal_option.get('rows', []):
+                        # Get item name
+                        name_obj = _mealdoo_localized(row.get('names', []), language)
+                        item_name = name_obj.get('name', '').strip() if name_obj else ''
+                        if not item_name or item_name in ['ESPANJA', '***']:  # Skip category headers
+                            continue
+
+                        # Get diet info if available
+                        diet_obj = _mealdoo_localized(row.get('diets', []), language)
+                        diet_shorts = diet_obj.get('dietShorts', []) if diet_obj else []
+
+                        # Format item with diet info
+                        if diet_shorts:
+                            item_display = f"{item_name} ({', '.join(diet_shorts)})"
+                        else:
+                            item_display = item_name
+
+                        items.append(item_display)
+
+                    if items:  # Only add if there are actual items
+                        parsed_data[day_obj][meal_name] = items
                     
         except (ValueError, IndexError) as e:
             print(f"Error parsing Mealdoo date {date_str}: {e}")
             continue
     
-    return parsed_data
+    return WeekMenu.from_languages(languages, default_language='fi')
 
 def parse_jamix_data(jamix_data):
-    """Parse Jamix API data into a format suitable for the Discord bot"""
+    """Parse Jamix API data into a WeekMenu"""
     parsed_data = {}
     
     if not jamix_data or not isinstance(jamix_data, list):
-        return parsed_data
+        return WeekMenu()
     
     # Get the first kitchen (assuming we want the first one)
     kitchen = jamix_data[0] if jamix_data else None
     if not kitchen:
-        return parsed_data
+        return WeekMenu()
     
     # Find the main menu type (usually the first one or "Ravintola Cube")
     main_menu_type = None
@@ -381,7 +525,7 @@ def parse_jamix_data(jamix_data):
     menu = main_menu_type.get('menus', [{}])[0] if main_menu_type else {}
     
     # Get today's date for filtering
-    today = datetime.now().date()
+    today = local_today()
     
     # Process each day
     for day_data in menu.get('days', []):
@@ -404,10 +548,8 @@ def parse_jamix_data(jamix_data):
                     print(f"Skipping past date: {day_obj}")
                     continue
                 
-                day_name = day_obj.strftime("%A, %B %d")
-                
                 # Initialize the day's menu
-                parsed_data[day_name] = {}
+                parsed_data[day_obj] = {}
                 
                 # Process meal options for this day
                 for meal_option in day_data.get('mealoptions', []):
@@ -424,23 +566,23 @@ def parse_jamix_data(jamix_data):
                             items.append(item_name)
                     
                     if items:  # Only add if there are actual items
-                        parsed_data[day_name][meal_name] = items
+                        parsed_data[day_obj][meal_name] = items
                         
             except (ValueError, IndexError) as e:
                 print(f"Error parsing date {date_int}: {e}")
                 continue
     
-    return parsed_data
+    return WeekMenu.from_dict(parsed_data)
 
 def parse_compass_data(compass_data):
-    """Parse Compass Group API data into a format suitable for the Discord bot"""
+    """Parse Compass Group API data into a WeekMenu"""
     parsed_data = {}
     
     if not compass_data or not isinstance(compass_data, dict):
-        return parsed_data
+        return WeekMenu()
     
     # Get today's date for filtering
-    today = datetime.now().date()
+    today = local_today()
     
     # Process each day's menu
     menus = compass_data.get('menus', [])
@@ -457,11 +599,8 @@ def parse_compass_data(compass_data):
             if day_obj < today:
                 continue
             
-            # Format day name
-            day_name = day_obj.strftime("%A, %B %d")
-            
             # Initialize the day's menu
-            parsed_data[day_name] = {}
+            parsed_data[day_obj] = {}
             
             # Process menu packages (categories like "KASVISLOUNAS", "KEITTOLOUNAS", etc.)
             menu_packages = day_data.get('menuPackages', [])
@@ -475,8 +614,8 @@ def parse_compass_data(compass_data):
                 meals = package.get('meals', [])
 
                 if meals:
-                    if display_key not in parsed_data[day_name]:
-                        parsed_data[day_name][display_key] = []
+                    if display_key not in parsed_data[day_obj]:
+                        parsed_data[day_obj][display_key] = []
 
                     for meal in meals:
                         meal_name = meal.get('name', '').strip()
@@ -488,142 +627,303 @@ def parse_compass_data(compass_data):
                         if diet_codes:
                             meal_name = f"{meal_name} ({', '.join(diet_codes)})"
 
-                        parsed_data[day_name][display_key].append(meal_name)
+                        parsed_data[day_obj][display_key].append(meal_name)
         
         except (ValueError, IndexError) as e:
             print(f"Error parsing Compass date {date_str}: {e}")
             continue
     
+    return WeekMenu.from_dict(parsed_data)
+
+def parse_menu_payload(api_data, guild_id=None):
+    """Detect which API a decoded response came from and parse it with the matching parser"""
+    parsed_data = None
+
+    # Check if it's Compass Group format (dict with 'weekNumber' and 'menus')
+    if isinstance(api_data, dict) and 'weekNumber' in api_data and 'menus' in api_data:
+        print(f"Detected Compass Group API format (Guild: {guild_id})")
+        parsed_data = parse_compass_data(api_data)
+    # Check if it's Mealdoo format (has 'allSuccessful' and 'data' keys)
+    elif isinstance(api_data, list) and len(api_data) > 0:
+        first_item = api_data[0]
+        if isinstance(first_item, dict) and 'allSuccessful' in first_item and 'data' in first_item:
+            print(f"Detected Mealdoo API format - {len(api_data)} day(s) (Guild: {guild_id})")
+            parsed_data = parse_mealdoo_data(api_data)
+        # Check if it's Jamix format (has 'menuTypes' or 'days')
+        elif 'menuTypes' in first_item or 'days' in first_item:
+            print(f"Detected Jamix API format (Guild: {guild_id})")
+            parsed_data = parse_jamix_data(api_data)
+        else:
+            print(f"Unknown API format (Guild: {guild_id})")
+            print(f"First item keys: {first_item.keys() if isinstance(first_item, dict) else 'Not a dict'}")
+
     return parsed_data
 
-async def fetch_menu_data(guild_id = None, retry_next_week = True, source_config = None):
+def reuse_parsed_menu(api_url, response):
+    """Return (previously parsed menu or None, body hash) for a 200 or 304 upstream response.
+
+    A 304 reuses the stored parse outright; a 200 whose body hashes the same as last time
+    skips JSON decoding and parsing. Days that have passed since the parse are dropped.
+    """
+    if response.status == 304:
+        parsed_data, body_hash = upstream_validators.not_modified(api_url), None
+        if parsed_data is not None:
+            print(f"Menu not modified, reusing parsed data: {api_url}")
+    else:
+        body_hash = ValidatorCache.hash_body(response.body)
+        parsed_data = upstream_validators.unchanged(api_url, body_hash, response.headers)
+        if parsed_data is not None:
+            print(f"Menu body unchanged, skipping parse: {api_url}")
+
+    if parsed_data is not None:
+        parsed_data = parsed_data.upcoming(local_today())
+    return parsed_data, body_hash
+
+def load_stored_menu(api_url):
+    """Return the persisted menu for a source URL if it is recent enough and still has upcoming days"""
+    entry = menu_store.get(api_url)
+    if entry is None or datetime.now().timestamp() - entry['fetched_at'] > MENU_STORE_MAX_STALE_SECONDS:
+        return None
+
+    menu = entry['menu'].upcoming(local_today())
+    if not menu:
+        return None
+
+    # Seed the validators too, so the revalidation after a restart can be answered with a 304
+    if api_url not in upstream_validators and (entry.get('etag') or entry.get('last_modified') or entry.get('body_hash')):
+        upstream_validators.store(api_url, entry.get('body_hash'), entry['menu'], {
+            'ETag': entry.get('etag'), 'Last-Modified': entry.get('last_modified'),
+        })
+    print(f"Serving stored menu while revalidating: {api_url}")
+    return menu
+
+def last_known_menu(guild_id, source_config):
+    """Return the last successfully fetched menu for a source, however old, or None"""
+    _, api_url, _ = resolve_source(guild_id, source_config)
+    entry = menu_store.get(api_url)
+    if entry is None:
+        return None
+    return entry['menu'].upcoming(local_today()) or None
+
+def revalidate_in_background(api_url, fetch):
+    """Refresh a source without making the caller wait (joins a fetch that is already in flight)"""
+    if api_url in menu_fetches:
+        return
+
+    async def revalidate():
+        try:
+            await menu_fetches.do(api_url, fetch)
+        except Exception as e:
+            print(f"Background refresh failed for {api_url}: {e}")
+
+    task = asyncio.create_task(revalidate())
+    background_refreshes.add(task)
+    task.add_done_callback(background_refreshes.discard)
+
+def default_horizon_days(api_type, now, include_next_week = True) -> int:
+    """Days ahead fetched for a source without its own "horizon_days".
+
+    Compass covers the rest of the current week (as of now), and from NEXT_WEEK_PREFETCH_WEEKDAY
+    onwards next week too. Mealdoo keeps its rolling 7-day window.
+    """
+    if api_type != "compass":
+        return 7
+    weekday = now.weekday()
+    days_left = 7 - weekday  # through Sunday
+    if include_next_week and weekday >= NEXT_WEEK_PREFETCH_WEEKDAY:
+        days_left += 7
+    return days_left
+
+def resolve_source(guild_id = None, source_config = None, include_next_week = True) -> tuple:
+    """Return (api_type, source key, window URLs) for an explicit source config, or for the guild's first source.
+
+    The window URLs are the upstream requests that together cover the source's horizon. The key
+    identifies the merged result in the caches: the URL itself when a single request is enough.
+    """
+    if not source_config and guild_id:
+        source_config = server_config.get_menu_sources(guild_id)[0]
+    if not source_config:
+        url = "https://fi.jamix.cloud/apps/menuservice/rest/haku/menu/12345/12?lang=fi"
+        return "jamix", url, [url]
+
+    # Week boundaries follow the kitchens' (and the daily jobs') time zone, not the container's
+    now = datetime.now(LOCAL_TZ)
+    api_type = source_config.get("api_type", "jamix")
+    horizon_days = source_config.get("horizon_days") or default_horizon_days(api_type, now, include_next_week)
+    urls = server_config.get_menu_urls_for_source(source_config, horizon_days, start=now)
+    return api_type, " ".join(urls), urls
+
+async def fetch_menu_data(guild_id = None, retry_next_week = True, source_config = None, force_refresh = False,
+                          revalidate = False, deadline = None):
     """Fetch menu data from the API (Jamix, Mealdoo, or Compass Group) for a specific server.
     
     Args:
         guild_id: The guild ID to fetch menu for
-        retry_next_week: If True, will try next week's menu if current week has no valid dates
+        retry_next_week: If True, weekly sources also fetch next week's menu near the end of the week
         source_config: Optional explicit source config dict (overrides guild_id lookup)
+        force_refresh: If True, skip the shared menu cache and always hit the API
+        revalidate: If True, answer from memory but refresh the source in the background even if it is fresh
+        deadline: Optional event loop time by which an upstream fetch must finish. Past it, TimeoutError is
+            raised while the fetch keeps running in the background and fills the cache for the next caller.
+
+    CircuitOpenError is raised (rather than swallowed) while the source's host is failing fast.
     """
     try:
-        async with aiohttp.ClientSession() as session:
-            headers = {}
-            if FOOD_API_KEY:
-                headers['Authorization'] = f'Bearer {FOOD_API_KEY}'
-            
-            # Determine api_type and url
-            if source_config:
-                api_type = source_config.get("api_type", "jamix")
-                api_url = server_config.get_menu_url_for_source(source_config)
-            elif guild_id:
-                config = server_config.get_server_config(guild_id)
-                api_type = config.get("api_type", "jamix")
-                api_url = server_config.get_menu_url(guild_id)
-            else:
-                api_type = "jamix"
-                api_url = "https://fi.jamix.cloud/apps/menuservice/rest/haku/menu/12345/12?lang=fi"
-            
-            print(f"Fetching menu from: {api_url}")
-            
-            # Fetch data from the API
-            async with session.get(api_url, headers=headers) as response:
-                if response.status == 200:
-                    api_data = await response.json()
-                    
-                    # Detect API type and use appropriate parser
-                    parsed_data = None
-                    
-                    # Check if it's Compass Group format (dict with 'weekNumber' and 'menus')
-                    if isinstance(api_data, dict) and 'weekNumber' in api_data and 'menus' in api_data:
-                        print(f"Detected Compass Group API format (Guild: {guild_id})")
-                        parsed_data = parse_compass_data(api_data)
-                    # Check if it's Mealdoo format (has 'allSuccessful' and 'data' keys)
-                    elif isinstance(api_data, list) and len(api_data) > 0:
-                        first_item = api_data[0]
-                        if isinstance(first_item, dict) and 'allSuccessful' in first_item and 'data' in first_item:
-                            print(f"Detected Mealdoo API format - {len(api_data)} day(s) (Guild: {guild_id})")
-                            parsed_data = parse_mealdoo_data(api_data)
-                        # Check if it's Jamix format (has 'menuTypes' or 'days')
-                        elif 'menuTypes' in first_item or 'days' in first_item:
-                            print(f"Detected Jamix API format (Guild: {guild_id})")
-                            parsed_data = parse_jamix_data(api_data)
-                        else:
-                            print(f"Unknown API format (Guild: {guild_id})")
-                            print(f"First item keys: {first_item.keys() if isinstance(first_item, dict) else 'Not a dict'}")
-                    
-                    # Check if parsed_data is empty (all dates were in the past)
-                    if parsed_data and len(parsed_data) == 0 and retry_next_week and (guild_id or source_config):
-                        # Retry for Compass (weekly menus) and Mealdoo APIs
-                        if api_type == "compass":
-                            print(f"Current week menu has no valid dates, trying next week... (Guild: {guild_id})")
-                            next_week = datetime.now() + timedelta(days=7)
-                            if source_config:
-                                next_week_url = server_config.get_menu_url_for_source(source_config, next_week)
-                            else:
-                                next_week_url = server_config.get_menu_url(guild_id, next_week)
-                            
-                            print(f"Fetching next week's menu from: {next_week_url}")
-                            async with session.get(next_week_url, headers=headers) as next_response:
-                                if next_response.status == 200:
-                                    next_api_data = await next_response.json()
-                                    if isinstance(next_api_data, dict) and 'weekNumber' in next_api_data and 'menus' in next_api_data:
-                                        parsed_data = parse_compass_data(next_api_data)
-                                        if parsed_data:
-                                            print(f"Successfully fetched next week's menu for {len(parsed_data)} days (Guild: {guild_id})")
-                        elif api_type == "mealdoo":
-                            print(f"Current dates have no valid menu, trying next week... (Guild: {guild_id})")
-                            next_week = datetime.now() + timedelta(days=7)
-                            if source_config:
-                                next_week_url = server_config.get_menu_url_for_source(source_config, next_week)
-                            else:
-                                next_week_url = server_config.get_menu_url(guild_id, next_week)
-                            
-                            print(f"Fetching next week's menu from: {next_week_url}")
-                            async with session.get(next_week_url, headers=headers) as next_response:
-                                if next_response.status == 200:
-                                    next_api_data = await next_response.json()
-                                    if isinstance(next_api_data, list) and len(next_api_data) > 0:
-                                        first_item = next_api_data[0]
-                                        if isinstance(first_item, dict) and 'allSuccessful' in first_item and 'data' in first_item:
-                                            parsed_data = parse_mealdoo_data(next_api_data)
-                                            if parsed_data:
-                                                print(f"Successfully fetched next week's menu for {len(parsed_data)} days (Guild: {guild_id})")
-                    
-                    if parsed_data and len(parsed_data) > 0:
-                        print(f"Successfully fetched menu data for {len(parsed_data)} days (Guild: {guild_id})")
-                        return parsed_data
-                    else:
-                        print(f"No menu data found in API response (Guild: {guild_id})")
-                        return None
-                else:
-                    print(f"API request failed with status: {response.status} (Guild: {guild_id})")
-                    response_text = await response.text()
-                    print(f"Response: {response_text[:500]}...")  # Print first 500 chars
-                    return None
-            
+        _, api_url, urls = resolve_source(guild_id, source_config, include_next_week=retry_next_week)
+        fetch = lambda: fetch_menu_from_api(api_url, urls, guild_id)
+
+        # The window URLs identify the source (api type, ids, language and date horizon)
+        if not force_refresh:
+            cached = menu_cache.get(api_url)
+            if cached is not None:
+                if revalidate:
+                    revalidate_in_background(api_url, fetch)
+                return cached
+
+            # Serve the last stored copy (e.g. right after a restart) and refresh it in the background
+            stale = load_stored_menu(api_url)
+            if stale is not None:
+                revalidate_in_background(api_url, fetch)
+                return stale
+
+        # Concurrent callers for the same source share one in-flight upstream request
+        if deadline is None:
+            return await menu_fetches.do(api_url, fetch)
+        remaining = max(deadline - asyncio.get_running_loop().time(), 0)
+        return await asyncio.wait_for(menu_fetches.do(api_url, fetch), timeout=remaining)
+
+    except (asyncio.TimeoutError, CircuitOpenError):
+        raise
     except Exception as e:
         print(f"Error fetching menu data for Guild {guild_id}: {e}")
         import traceback
         traceback.print_exc()
         return None
 
-async def fetch_all_menus_data(guild_id) -> dict | None:
+async def fetch_menu_window(url, headers, guild_id = None):
+    """Fetch and parse one upstream window, returning a WeekMenu (possibly empty) or None if the request failed"""
+    print(f"Fetching menu from: {url}")
+
+    # Conditional request, so the upstream can answer 304 if nothing changed since the last parse
+    conditional_headers = {**headers, **upstream_validators.request_headers(url)}
+    response = await http_client.get(url, headers=conditional_headers, client=guild_id)
+    if response.status not in (200, 304):
+        print(f"API request failed with status: {response.status} (Guild: {guild_id})")
+        response_text = response.text()
+        print(f"Response: {response_text[:500]}...")  # Print first 500 chars
+        return None
+
+    parsed_data, body_hash = reuse_parsed_menu(url, response)
+    if parsed_data is None and response.status == 200:
+        parsed_data = parse_menu_payload(response.json(), guild_id)
+        if parsed_data is not None:
+            # Empty parses are remembered too: a past week keeps answering 304 instead of being parsed again
+            upstream_validators.store(url, body_hash, parsed_data, response.headers)
+    return parsed_data
+
+async def fetch_menu_from_api(api_url, urls, guild_id = None):
+    """Perform the upstream requests for one source, merge their windows and store the result under api_url.
+    
+    urls come from resolve_source, current window first; they are requested concurrently and merged
+    into one date-ordered menu, so browsing further ahead never needs another fetch.
+    Called through the singleflight group in fetch_menu_data, so identical sources are only fetched once at a time.
+    The requests go through the per-host token bucket in http_client, queued fairly between guilds.
+    """
+    headers = {}
+    if FOOD_API_KEY:
+        headers['Authorization'] = f'Bearer {FOOD_API_KEY}'
+
+    results = await asyncio.gather(*(fetch_menu_window(url, headers, guild_id) for url in urls),
+                                   return_exceptions=True)
+
+    # The current window decides success; a failed extra window only shortens the menu
+    if isinstance(results[0], BaseException):
+        raise results[0]
+    windows = []
+    for url, result in zip(urls, results):
+        if isinstance(result, BaseException):
+            print(f"Skipping menu window {url}: {result.__class__.__name__}: {result}")
+        elif result:
+            windows.append(result)
+
+    parsed_data = WeekMenu.merge(windows)
+    if len(parsed_data) > 0:
+        print(f"Successfully fetched menu data for {len(parsed_data)} days (Guild: {guild_id})")
+        menu_cache.set(api_url, parsed_data)
+        # Validators only mean something for a single window; merged sources are revalidated per window
+        menu_store.put(api_url, parsed_data, upstream_validators.export(urls[0]) if len(urls) == 1 else None)
+        return parsed_data
+    else:
+        print(f"No menu data found in API response (Guild: {guild_id})")
+        return None
+
+async def fetch_all_menus_data(guild_id, force_refresh=False, revalidate=False, deadline=None,
+                               stale: set | None = None, language: str | None = None) -> dict | None:
     """Fetch menu data for every configured source of a guild.
     
     Returns a dict of {source_name: menu_data}, or None if all sources failed.
+    Each menu is shown in language if its source provides it, otherwise in the source's configured language.
+    Set force_refresh to bypass the shared menu cache, or revalidate to answer from memory
+    and refresh every source in the background (used by the refresh buttons).
+    Sources that miss the deadline, or whose host circuit is open, fall back to their last
+    good copy and their names are added to the stale set.
     """
     sources = server_config.get_menu_sources(guild_id)
     all_menus: dict = {}
 
-    for source in sources:
+    # Fetch every source concurrently; fetch_menu_data bounds the upstream calls globally
+    results = await asyncio.gather(
+        *(fetch_menu_data(guild_id=guild_id, source_config=source, force_refresh=force_refresh,
+                          revalidate=revalidate, deadline=deadline)
+          for source in sources),
+        return_exceptions=True,
+    )
+
+    # Keep the configured source order, isolating failures per source
+    for source, data in zip(sources, results):
         name = source.get("name", "Ruokalista")
-        data = await fetch_menu_data(guild_id=guild_id, source_config=source)
-        if data:
-            all_menus[name] = data
+        if isinstance(data, (asyncio.TimeoutError, CircuitOpenError)):
+            reason = "missed the deadline" if isinstance(data, asyncio.TimeoutError) else f"is unavailable ({data})"
+            data = last_known_menu(guild_id, source)
+            print(f"Source '{name}' {reason} for guild {guild_id}"
+                  f"{', showing its last good copy' if data else ' and has no saved copy'}")
+            if data:
+                all_menus[name] = data.in_language(language or source.get("language"))
+                if stale is not None:
+                    stale.add(name)
+        elif isinstance(data, BaseException):
+            print(f"Source '{name}' failed for guild {guild_id}: {data}")
+        elif data:
+            all_menus[name] = data.in_language(language or source.get("language"))
         else:
             print(f"Source '{name}' returned no data for guild {guild_id}")
 
     return all_menus if all_menus else None
 
+async def refresh_menus_for_message(guild_id, message_id, stale: set | None = None,
+                                    language: str | None = None) -> dict | None:
+    """Return menus for a refresh click and refresh their sources in the background.
+    
+    The click is answered from memory (the background refresher keeps it recent); only a source
+    that has never been fetched waits on the upstream. Clicks on the same message within
+    REFRESH_COOLDOWN_SECONDS get the result the first click got.
+    Names of sources shown from a saved copy are added to stale.
+    """
+    stale = stale if stale is not None else set()
+    if message_id:
+        recent = refresh_results.get(str(message_id))
+        if recent is not None:
+            new_all_menus, recent_stale = recent
+            stale.update(recent_stale)
+            return new_all_menus
+
+    deadline = asyncio.get_running_loop().time() + INTERACTION_FETCH_BUDGET_SECONDS
+    new_all_menus = await fetch_all_menus_data(guild_id, revalidate=True, deadline=deadline, stale=stale,
+                                               language=language)
+    if new_all_menus and message_id:
+        refresh_results.set(str(message_id), (new_all_menus, frozenset(stale)))
+    return new_all_menus
+
 
 async def handle_menu_navigation(interaction: discord.Interaction, direction: int):
     """Handle navigation button clicks by loading state from database"""
@@ -634,7 +934,7 @@ async def handle_menu_navigation(interaction: discord.Interaction, direction: in
         return
     
     # Load menu data from database
-    menu_info = button_db.get_menu_view(message_id)
+    menu_info = await button_db.get_menu_view_async(message_id)
     
     if not menu_info:
         await interaction.response.send_message("❌ Menu data not found. This might be an expired view.", ephemeral=True)
@@ -653,29 +953,15 @@ async def handle_menu_navigation(interaction: discord.Interaction, direction: in
         active_menu = menu_info['menu_data']
         source_name = None
 
-    days = list(active_menu.keys())
+    days = active_menu.days
     new_day = (menu_info['current_day'] + direction) % len(days)
-    current_day_name = days[new_day]
-    day_menu = active_menu[current_day_name]
-    
-    # Build title
-    if source_name and all_menus_data and len(all_menus_data) > 1:
-        title = f"🍽️ {source_name} — {current_day_name}"
-    else:
-        title = f"🍽️ Ruokalista — {current_day_name}"
+    embed = render_menu_embed(
+        active_menu, new_day, source_name, bool(all_menus_data) and len(all_menus_data) > 1,
+    )
 
-    embed = discord.Embed(title=title, color=0x00ff00, timestamp=datetime.now())
-    for category, items in day_menu.items():
-        if items:
-            items_text = "\n".join([f"• {item}" for item in items])
-            embed.add_field(name=f"**{category}**", value=items_text, inline=False)
-    
     if is_ephemeral:
         embed.set_footer(text=f"Day {new_day + 1} of {len(days)} | Click buttons to navigate (personal view)")
-        button_db.save_menu_view(
-            message_id, menu_info['guild_id'], menu_info['channel_id'],
-            active_menu, new_day, all_menus_data, current_source,
-        )
+        button_db.queue_menu_state(message_id, new_day, current_source)
         await interaction.response.edit_message(embed=embed)
     else:
         embed.set_footer(text=f"Day {new_day + 1} of {len(days)} | Click buttons to navigate (personal view)")
@@ -692,7 +978,7 @@ async def handle_menu_source_select(interaction: discord.Interaction, source_val
         await interaction.response.send_message("❌ Could not identify message", ephemeral=True)
         return
 
-    menu_info = button_db.get_menu_view(message_id)
+    menu_info = await button_db.get_menu_view_async(message_id)
 
     if not menu_info or not menu_info.get('all_menus_data'):
         await interaction.response.send_message("❌ Multi-source menu data not found.", ephemeral=True)
@@ -708,20 +994,8 @@ async def handle_menu_source_select(interaction: discord.Interaction, source_val
 
     source_name = sources[source_idx]
     active_menu = all_menus_data[source_name]
-    days = list(active_menu.keys())
-    current_day_name = days[0] if days else ""
-
-    if len(all_menus_data) > 1:
-        title = f"🍽️ {source_name} — {current_day_name}"
-    else:
-        title = f"🍽️ Ruokalista — {current_day_name}"
-
-    embed = discord.Embed(title=title, color=0x00ff00, timestamp=datetime.now())
-    if current_day_name:
-        for category, items in active_menu[current_day_name].items():
-            if items:
-                items_text = "\n".join([f"• {item}" for item in items])
-                embed.add_field(name=f"**{category}**", value=items_text, inline=False)
+    days = active_menu.days
+    embed = render_menu_embed(active_menu, 0, source_name, len(all_menus_data) > 1)
 
     is_ephemeral = interaction.message and interaction.message.flags.ephemeral
     user_view = MenuView(active_menu, 0, menu_info['guild_id'], persistent=False,
@@ -729,10 +1003,7 @@ async def handle_menu_source_select(interaction: discord.Interaction, source_val
 
     if is_ephemeral:
         embed.set_footer(text=f"Day 1 of {len(days)} | {source_name} (personal view)")
-        button_db.save_menu_view(
-            message_id, menu_info['guild_id'], menu_info['channel_id'],
-            active_menu, 0, all_menus_data, source_idx,
-        )
+        button_db.queue_menu_state(message_id, 0, source_idx)
         await interaction.response.edit_message(embed=embed, view=user_view)
     else:
         embed.set_footer(text=f"Day 1 of {len(days)} | {source_name} (personal view)")
@@ -746,7 +1017,7 @@ async def handle_menu_refresh(interaction: discord.Interaction):
         await interaction.response.send_message("❌ Could not identify message", ephemeral=True)
         return
     
-    menu_info = button_db.get_menu_view(message_id)
+    menu_info = await button_db.get_menu_view_async(message_id)
     
     if not menu_info:
         await interaction.response.send_message("❌ Menu data not found", ephemeral=True)
@@ -757,7 +1028,8 @@ async def handle_menu_refresh(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
     
     guild_id = menu_info['guild_id']
-    new_all_menus = await fetch_all_menus_data(guild_id)
+    stale = set()
+    new_all_menus = await refresh_menus_for_message(guild_id, message_id, stale)
     
     if new_all_menus:
         # Preserve current source selection if possible
@@ -774,32 +1046,21 @@ async def handle_menu_refresh(interaction: discord.Interaction):
         new_sources = list(new_all_menus.keys())
         active_source_name = new_sources[new_source_idx]
         active_menu = new_all_menus[active_source_name]
-        days = list(active_menu.keys())
-        current_day_name = days[0] if days else ""
-
-        if len(new_all_menus) > 1:
-            title = f"🍽️ {active_source_name} — {current_day_name}"
-        else:
-            title = f"🍽️ Ruokalista — {current_day_name}"
-
-        embed = discord.Embed(title=title, color=0x00ff00, timestamp=datetime.now())
-        if current_day_name:
-            for category, items in active_menu[current_day_name].items():
-                if items:
-                    items_text = "\n".join([f"• {item}" for item in items])
-                    embed.add_field(name=f"**{category}**", value=items_text, inline=False)
+        days = active_menu.days
+        embed = render_menu_embed(active_menu, 0, active_source_name, len(new_all_menus) > 1)
+        stale_notice = f"\n{STALE_NOTICE}" if active_source_name in stale else ""
 
         if is_ephemeral:
-            embed.set_footer(text=f"Day 1 of {len(days)} | Click buttons to navigate | Refreshed (personal view)")
-            button_db.save_menu_view(
+            embed.set_footer(text=f"Day 1 of {len(days)} | Click buttons to navigate | Refreshed (personal view){stale_notice}")
+            await button_db.save_menu_view_async(
                 message_id, guild_id, menu_info['channel_id'],
                 active_menu, 0, new_all_menus, new_source_idx,
             )
             await interaction.edit_original_response(embed=embed)
         else:
-            embed.set_footer(text=f"Day 1 of {len(days)} | Click buttons to navigate | Refreshed (personal view)")
+            embed.set_footer(text=f"Day 1 of {len(days)} | Click buttons to navigate | Refreshed (personal view){stale_notice}")
             user_view = MenuView(active_menu, 0, guild_id, persistent=False,
-                                 all_menus_data=new_all_menus, current_source=new_source_idx)
+                                 all_menus_data=new_all_menus, current_source=new_source_idx, stale_sources=stale)
             await interaction.followup.send(embed=embed, view=user_view, ephemeral=True)
     else:
         await interaction.followup.send("❌ Failed to refresh menu data.", ephemeral=True)
@@ -851,15 +1112,37 @@ async def on_ready():
     except Exception as e:
         print(f"Error registering persistent view handler: {e}")
     
-    # Start the daily menu posting task
-    daily_menu_post.start()
+    # Start the daily menu staging and posting tasks (on_ready runs again after a reconnect)
+    if not stage_daily_menus.is_running():
+        stage_daily_menus.start()
+    if not daily_menu_post.is_running():
+        daily_menu_post.start()
     
     # Start the periodic cleanup task
-    cleanup_old_menus_task.start()
+    if not cleanup_old_menus_task.is_running():
+        cleanup_old_menus_task.start()
+
+    # Start flushing queued navigation state
+    if not flush_menu_states_task.is_running():
+        flush_menu_states_task.start()
+
+    # Start keeping every configured source warm (the first run fetches everything)
+    if not refresh_menus_task.is_running():
+        refresh_menus_task.start()
     print("Started periodic cleanup task (runs every 24 hours)")
 
+# Languages users can pick for /menu and /today (shown if the source's provider returns them)
+MENU_LANGUAGE_DESCRIPTION = "Menu language (defaults to the source's language; Mealdoo sources have every language)"
+MENU_LANGUAGE_CHOICES = [
+    app_commands.Choice(name="Suomi", value="fi"),
+    app_commands.Choice(name="English", value="en"),
+    app_commands.Choice(name="Svenska", value="sv"),
+]
+
 @bot.tree.command(name='menu', description='Show the weekly menu (ephemeral for users, public for admins)')
-async def show_menu(interaction: discord.Interaction):
+@app_commands.describe(language=MENU_LANGUAGE_DESCRIPTION)
+@app_commands.choices(language=MENU_LANGUAGE_CHOICES)
+async def show_menu(interaction: discord.Interaction, language: app_commands.Choice[str] | None = None):
     """Show the weekly menu with interactive navigation"""
     guild_id = interaction.guild.id if interaction.guild else None
     
@@ -868,58 +1151,56 @@ async def show_menu(interaction: discord.Interaction):
     
     await interaction.response.defer(ephemeral=not is_admin)
     
-    all_menus = await fetch_all_menus_data(guild_id)
+    stale = set()
+    deadline = asyncio.get_running_loop().time() + INTERACTION_FETCH_BUDGET_SECONDS
+    language = language.value if language else None
+    all_menus = await fetch_all_menus_data(guild_id, deadline=deadline, stale=stale, language=language)
     
     if not all_menus:
         await interaction.followup.send("❌ Ei voitu noutaa ruokalistaa tällä hetkellä. Yritä myöhemmin uudelleen.")
         return
     
     view = MenuView(menu_data=None, guild_id=guild_id, persistent=False,
-                    all_menus_data=all_menus, current_source=0)
+                    all_menus_data=all_menus, current_source=0, stale_sources=stale, language=language)
     embed = view.create_menu_embed()
     
     await interaction.followup.send(embed=embed, view=view)
 
 @bot.tree.command(name='today', description='Show today\'s menu')
-async def todays_menu(interaction: discord.Interaction):
+@app_commands.describe(language=MENU_LANGUAGE_DESCRIPTION)
+@app_commands.choices(language=MENU_LANGUAGE_CHOICES)
+async def todays_menu(interaction: discord.Interaction, language: app_commands.Choice[str] | None = None):
     """Show today's menu (or next available menu)"""
     guild_id = interaction.guild.id if interaction.guild else None
     
     await interaction.response.defer(ephemeral=True)
     
-    all_menus = await fetch_all_menus_data(guild_id)
+    stale = set()
+    deadline = asyncio.get_running_loop().time() + INTERACTION_FETCH_BUDGET_SECONDS
+    all_menus = await fetch_all_menus_data(guild_id, deadline=deadline, stale=stale,
+                                           language=language.value if language else None)
     
     if not all_menus:
         await interaction.followup.send("❌ Ei voitu noutaa ruokalistaa tällä hetkellä. Yritä myöhemmin uudelleen.")
         return
     
-    today = datetime.now()
-    today_str = today.strftime("%A, %B %d")
+    today = local_today()
 
     # Build one embed per source, showing their first available day
     embeds = []
     for source_name, menu_data in all_menus.items():
-        days = list(menu_data.keys())
-        if not days:
+        if not menu_data.days:
             continue
-        found_day_name = days[0]
-        found_menu = menu_data[found_day_name]
-        is_today = (found_day_name == today_str)
-
-        if len(all_menus) > 1:
-            title = f"🍽️ {source_name} — {found_day_name}"
-        else:
-            title = f"🍽️ Ruokalista — {found_day_name}"
+        found_day = menu_data.days[0]
+        is_today = (found_day.date == today)
 
-        embed = discord.Embed(title=title, color=0x00ff00, timestamp=datetime.now())
+        embed = render_menu_embed(menu_data, 0, source_name, len(all_menus) > 1)
         if not is_today:
             embed.description = "*Tämän päivän ruokalistaa ei saatavilla. Näytetään seuraava saatavilla oleva ruokalista.*"
-        for category, items in found_menu.items():
-            if items:
-                items_text = "\n".join([f"• {item}" for item in items])
-                embed.add_field(name=f"**{category}**", value=items_text, inline=False)
-        if not any(found_menu.values()):
+        if not found_day.has_items():
             embed.add_field(name="No Menu Available", value="No menu items found for this day.", inline=False)
+        if source_name in stale:
+            embed.set_footer(text=STALE_NOTICE)
         embeds.append(embed)
 
     if embeds:
@@ -927,113 +1208,218 @@ async def todays_menu(interaction: discord.Interaction):
     else:
         await interaction.followup.send("❌ No menu available for today or upcoming days.")
 
-@tasks.loop(time=time(hour=7, minute=00, tzinfo=zoneinfo.ZoneInfo("Europe/Helsinki")))  # Run daily at 7:00 AM Finnish time (handles DST automatically)
+async def stage_daily_menu_for_guild(guild_id: int, config: dict):
+    """Fetch, parse and render the daily menu for one guild without sending anything.
+
+    Returns (status, staged_post) where status is "staged", "skipped" or "failed".
+    """
+    daily_channel_id = config.get("daily_channel_id")
+    
+    if not daily_channel_id:
+        print(f"No daily channel configured for guild {guild_id}, skipping...")
+        return "skipped", None
+    
+    guild = bot.get_guild(guild_id)
+    if not guild:
+        print(f"Guild {guild_id} not found, skipping...")
+        return "skipped", None
+    
+    channel = bot.get_channel(daily_channel_id)
+    if not channel or not isinstance(channel, discord.TextChannel):
+        print(f"Channel {daily_channel_id} not found for guild {guild_id}, skipping...")
+        return "skipped", None
+    
+    stale = set()
+    all_menus = await fetch_all_menus_data(guild_id, stale=stale)
+    if not all_menus:
+        """ await channel.send("❌ Ei voitu noutaa tämän päivän ruokalistaa.") """
+        return "failed", None
+    
+    # Use the first source as primary for the shared daily message
+    first_source_name = list(all_menus.keys())[0]
+    menu_data = all_menus[first_source_name]
+
+    # Since menu_data already has past dates filtered out, just get the first available day
+    if not menu_data.days:
+        print(f"No menu days available for guild {guild_id}")
+        return "failed", None
+    
+    # Get the first available day (which is the earliest future date)
+    found_day = menu_data.days[0]
+    found_day_name = found_day.label
+    
+    # Check if this is actually today
+    today = datetime.now(LOCAL_TZ)
+    is_today = (found_day.date == today.date())
+    
+    staged = {
+        'guild_id': guild_id,
+        'guild_name': guild.name,
+        'channel': channel,
+        'staged_on': today.date(),
+        'message': None,
+        'embed': None,
+        'view': None,
+        'menu_data': menu_data,
+        'current_day': 0,
+        'all_menus_data': all_menus,
+    }
+    
+    if found_day.categories:
+        # Find the index of the menu for the view
+        current_day_index = menu_data.index_of(found_day.date) or 0
+        
+        # Use persistent=True for daily messages so buttons don't expire
+        view = MenuView(
+            menu_data=None, current_day=current_day_index, guild_id=guild_id, persistent=True,
+            all_menus_data=all_menus, current_source=0, stale_sources=stale,
+        )
+        
+        if len(all_menus) > 1:
+            message = f"**Ruokalista {found_day_name}:** (käytä valikkoa vaihtaaksesi ravintolaa)"
+        else:
+            message = f"**Ruokalista {found_day_name}:**"
+        if not is_today:
+            message = f"**Tämän päivän ruokalista ei saatavilla, näytetään {found_day_name}:**"
+
+        staged.update(message=message, embed=view.create_menu_embed(), view=view, current_day=current_day_index)
+    else:
+        staged['message'] = "❌ Ruokalistaa ei ole saatavilla."
+    
+    return "staged", staged
+
+async def publish_daily_menu(staged: dict) -> str:
+    """Send a staged daily menu and persist its view. Only Discord and database work happens here."""
+    guild_id = staged['guild_id']
+    channel = staged['channel']
+    
+    if staged['view'] is None:
+        await channel.send(staged['message'])
+        print(f"No menu available for guild {guild_id} ({staged['guild_name']})")
+        return "failed"
+    
+    # The embed was rendered at staging time; show when it was actually posted
+    staged['embed'].timestamp = datetime.now()
+    sent_message = await channel.send(staged['message'], embed=staged['embed'], view=staged['view'])
+    
+    # Save to database for persistence across restarts
+    staged['view'].message_id = sent_message.id
+    await button_db.save_menu_view_async(
+        sent_message.id,
+        guild_id,
+        channel.id,
+        staged['menu_data'],
+        staged['current_day'],
+        staged['all_menus_data'],
+        0,
+    )
+    
+    print(f"Posted daily menu for guild {guild_id} ({staged['guild_name']})")
+    return "posted"
+
+async def post_daily_menu_for_guild(guild_id: int, config: dict) -> str:
+    """Post the daily menu for one guild, using the pre-staged payload when there is one for today.
+
+    Returns "posted", "skipped" or "failed" for the run summary.
+    """
+    today = local_today()
+    staged = staged_daily_posts.pop(guild_id, None)
+    
+    try:
+        if not staged or staged['staged_on'] != today:
+            # Nothing staged in time (or staging failed): do the full pipeline now
+            status, staged = await stage_daily_menu_for_guild(guild_id, config)
+            if status != "staged":
+                return status
+        
+        return await publish_daily_menu(staged)
+    
+    except Exception as e:
+        print(f"Error posting daily menu for guild {guild_id}: {e}")
+        channel = bot.get_channel(config.get("daily_channel_id") or 0)
+        try:
+            if isinstance(channel, discord.TextChannel):
+                await channel.send("❌ Virhe julkaistaessa päivittäistä ruokalistaa. Tarkista asetukset.")
+        except:
+            pass  # Channel might not be accessible
+        return "failed"
+
+async def run_for_all_guilds(handler, servers_config: dict) -> list:
+    """Run handler(guild_id, config) for every guild with bounded parallelism and a per-guild time budget"""
+    semaphore = asyncio.Semaphore(DAILY_POST_CONCURRENCY)
+    
+    async def run_guild(guild_id_str: str, config: dict):
+        guild_id = int(guild_id_str)
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(handler(guild_id, config), DAILY_POST_GUILD_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"Daily menu job for guild {guild_id} timed out after {DAILY_POST_GUILD_TIMEOUT}s")
+                return "failed"
+            except Exception as e:
+                print(f"Unexpected error in daily menu job for guild {guild_id}: {e}")
+                return "failed"
+    
+    return await asyncio.gather(*(run_guild(g, c) for g, c in list(servers_config.items())))
+
+@tasks.loop(time=DAILY_STAGE_TIME)
+async def stage_daily_menus():
+    """Prefetch and render every guild's daily menu shortly before the publish time (weekdays only)"""
+    today = datetime.now(tz=LOCAL_TZ)
+    if today.weekday() >= 5:  # Saturday (5) or Sunday (6)
+        return
+    
+    print(f"Staging daily menus for {today.strftime('%A')}...")
+    staged_daily_posts.clear()
+    
+    async def stage(guild_id: int, config: dict) -> str:
+        status, staged = await stage_daily_menu_for_guild(guild_id, config)
+        if staged:
+            staged_daily_posts[guild_id] = staged
+        return status
+    
+    started = datetime.now()
+    results = await run_for_all_guilds(stage, server_config.list_daily_servers())
+    elapsed = (datetime.now() - started).total_seconds()
+    
+    print(
+        f"Daily menu staging finished in {elapsed:.1f}s: "
+        f"{results.count('staged')} staged, {results.count('failed')} failed, "
+        f"{results.count('skipped')} skipped ({len(results)} guilds)"
+    )
+
+@stage_daily_menus.before_loop
+async def before_stage_daily_menus():
+    """Wait until bot is ready before starting the staging task"""
+    await bot.wait_until_ready()
+
+@tasks.loop(time=time(hour=7, minute=00, tzinfo=LOCAL_TZ))  # Run daily at 7:00 AM Finnish time (handles DST automatically)
 async def daily_menu_post():
     """Post daily menu automatically at 7:00 AM local time for all configured servers (weekdays only)"""
     print("Daily menu posting task triggered...")
     
     # Check if today is a weekday (Monday=0, Sunday=6)
-    today = datetime.now(tz=zoneinfo.ZoneInfo("Europe/Helsinki"))
+    today = datetime.now(tz=LOCAL_TZ)
     if today.weekday() >= 5:  # Saturday (5) or Sunday (6)
         print(f"Skipping daily menu post - today is {today.strftime('%A')} (weekend)")
         return
     
-    print(f"Starting daily menu posting for {today.strftime('%A')}...")
+    print(f"Starting daily menu posting for {today.strftime('%A')} ({len(staged_daily_posts)} pre-staged)...")
     
-    # Get all configured servers
-    servers_config = server_config.list_servers()
+    # Get all servers with a daily channel configured
+    servers_config = server_config.list_daily_servers()
     
-    for guild_id_str, config in servers_config.items():
-        guild_id = int(guild_id_str)
-        daily_channel_id = config.get("daily_channel_id")
-        
-        if not daily_channel_id:
-            print(f"No daily channel configured for guild {guild_id}, skipping...")
-            continue
-        
-        guild = bot.get_guild(guild_id)
-        if not guild:
-            print(f"Guild {guild_id} not found, skipping...")
-            continue
-        
-        channel = bot.get_channel(daily_channel_id)
-        if not channel or not isinstance(channel, discord.TextChannel):
-            print(f"Channel {daily_channel_id} not found for guild {guild_id}, skipping...")
-            continue
-        
-        try:
-            all_menus = await fetch_all_menus_data(guild_id)
-            if not all_menus:
-                """ await channel.send("❌ Ei voitu noutaa tämän päivän ruokalistaa.") """
-                continue
-            
-            # Use the first source as primary for the shared daily message
-            first_source_name = list(all_menus.keys())[0]
-            menu_data = all_menus[first_source_name]
-
-            # Since menu_data already has past dates filtered out, just get the first available day
-            days = list(menu_data.keys())
-            if not days:
-                print(f"No menu days available for guild {guild_id}")
-                continue
-            
-            # Get the first available day (which is the earliest future date)
-            found_day_name = days[0]
-            found_menu = menu_data[found_day_name]
-            
-            # Check if this is actually today
-            local_tz = zoneinfo.ZoneInfo("Europe/Helsinki")
-            today = datetime.now(local_tz)
-            today_str = today.strftime("%A, %B %d")
-            is_today = (found_day_name == today_str)
-            
-            if found_menu and found_day_name:
-                # Find the index of the menu for the view
-                day_names = list(menu_data.keys())
-                try:
-                    current_day_index = day_names.index(found_day_name)
-                except ValueError:
-                    current_day_index = 0
-                
-                # Use persistent=True for daily messages so buttons don't expire
-                view = MenuView(
-                    menu_data=None, current_day=current_day_index, guild_id=guild_id, persistent=True,
-                    all_menus_data=all_menus, current_source=0,
-                )
-                embed = view.create_menu_embed()
-                
-                if len(all_menus) > 1:
-                    message = f"**Ruokalista {found_day_name}:** (käytä valikkoa vaihtaaksesi ravintolaa)"
-                else:
-                    message = f"**Ruokalista {found_day_name}:**"
-                if not is_today:
-                    message = f"**Tämän päivän ruokalista ei saatavilla, näytetään {found_day_name}:**"
-
-                sent_message = await channel.send(message, embed=embed, view=view)
-                
-                # Save to database for persistence across restarts
-                view.message_id = sent_message.id
-                button_db.save_menu_view(
-                    sent_message.id,
-                    guild_id,
-                    channel.id,
-                    menu_data,
-                    current_day_index,
-                    all_menus,
-                    0,
-                )
-                
-                print(f"Posted daily menu for guild {guild_id} ({guild.name})")
-            else:
-                await channel.send(f"❌ Ruokalistaa ei ole saatavilla.")
-                print(f"No menu available for guild {guild_id} ({guild.name})")
-                
-        except Exception as e:
-            print(f"Error posting daily menu for guild {guild_id}: {e}")
-            try:
-                await channel.send("❌ Virhe julkaistaessa päivittäistä ruokalistaa. Tarkista asetukset.")
-            except:
-                pass  # Channel might not be accessible
+    # Guilds run concurrently; each gets its own time budget so one hung upstream can't delay the rest
+    started = datetime.now()
+    results = await run_for_all_guilds(post_daily_menu_for_guild, servers_config)
+    elapsed = (datetime.now() - started).total_seconds()
+    staged_daily_posts.clear()
+    
+    print(
+        f"Daily menu posting finished in {elapsed:.1f}s: "
+        f"{results.count('posted')} posted, {results.count('failed')} failed, "
+        f"{results.count('skipped')} skipped ({len(results)} guilds)"
+    )
 
 @bot.tree.command(name='test_daily_posting', description='Show today\'s menu')
 async def test_daily_posting(interaction: discord.Interaction):
@@ -1056,11 +1442,15 @@ async def cleanup_old_menus_task():
     """Periodically clean up old persistent menu views from the database"""
     print("Running periodic database cleanup...")
     try:
-        deleted_count = button_db.cleanup_old_menus(days=7)
+        report = await button_db.cleanup_old_menus_async(days=7)
+        deleted_count = report['deleted']
         if deleted_count > 0:
-            print(f"Periodic cleanup: Removed {deleted_count} old menu view(s)")
+            print(f"Periodic cleanup: Removed {deleted_count} old menu view(s), "
+                  f"database {report['size_before'] / 1024:.0f} KiB -> {report['size_after'] / 1024:.0f} KiB")
         else:
             print("Periodic cleanup: No old menus to remove")
+        stats = button_db.view_cache_stats()
+        print(f"Menu view cache: {stats['hits']} hits, {stats['misses']} misses, {stats['size']} cached")
     except Exception as e:
         print(f"Error during periodic cleanup: {e}")
 
@@ -1069,6 +1459,57 @@ async def before_cleanup_task():
     """Wait until bot is ready before starting the cleanup task"""
     await bot.wait_until_ready()
 
+@tasks.loop(seconds=MENU_STATE_FLUSH_SECONDS)
+async def flush_menu_states_task():
+    """Write queued navigation state to the database in one batch"""
+    try:
+        await button_db.flush_menu_states_async()
+    except Exception as e:
+        print(f"Error flushing menu state: {e}")
+
+@tasks.loop(minutes=1)
+async def refresh_menus_task():
+    """Refresh every configured source that is due, so interactions are answered from memory"""
+    now = datetime.now().timestamp()
+    scheduled = {}
+    due = 0
+    for guild_id_str, config in list(server_config.list_servers().items()):
+        # Skip keys that aren't guilds (a DM interaction saves "None") and servers nobody has configured
+        if not guild_id_str.isdigit() or server_config.is_placeholder(config):
+            continue
+
+        # One broken guild only skips its own sources
+        try:
+            guild_id = int(guild_id_str)
+            for source in server_config.get_menu_sources(guild_id):
+                _, api_url, urls = resolve_source(guild_id, source)
+                if api_url in scheduled:
+                    continue  # shared with a guild that was already scheduled this round
+
+                next_at = next_source_refresh.get(api_url, 0)
+                if now >= next_at:
+                    next_at = now + float(source.get("refresh_minutes") or MENU_REFRESH_MINUTES) * 60
+                    revalidate_in_background(
+                        api_url,
+                        lambda api_url=api_url, urls=urls, guild_id=guild_id:
+                            fetch_menu_from_api(api_url, urls, guild_id),
+                    )
+                    due += 1
+                scheduled[api_url] = next_at
+        except Exception as e:
+            print(f"Error scheduling menu refreshes for guild {guild_id_str}: {e}")
+
+    # Sources that are no longer configured (or whose URL rolled over to a new date window) drop out here
+    next_source_refresh.clear()
+    next_source_refresh.update(scheduled)
+    if due:
+        print(f"Background refresh started for {due} of {len(scheduled)} source(s)")
+
+@refresh_menus_task.before_loop
+async def before_refresh_menus_task():
+    """Wait until bot is ready before starting the refresh task"""
+    await bot.wait_until_ready()
+
 # Admin Commands
 @bot.tree.command(name='set_menu_channel', description='Set the channel for daily menu posts')
 @app_commands.describe(channel="The channel where daily menus will be posted")
@@ -1216,6 +1657,35 @@ async def remove_menu_source(interaction: discord.Interaction, name: str):
         await interaction.followup.send(f"❌ Source named **{name}** not found. Use `/list_menu_sources` to see configured sources.")
 
 
+@bot.tree.command(name='set_menu_horizon', description='Set how many days ahead a menu source is fetched')
+@app_commands.describe(
+    name='The display name of the source',
+    days=f'Days ahead to fetch (1-{MAX_HORIZON_DAYS}, 0 restores the default)',
+)
+async def set_menu_horizon(interaction: discord.Interaction, name: str, days: app_commands.Range[int, 0, MAX_HORIZON_DAYS]):
+    """Set the fetch horizon of a named menu source (Admin only)"""
+    if not isinstance(interaction.user, discord.Member) or not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("❌ Sinä tarvitset ylläpitäjäoikeudet käyttääksesi tätä komentoa.", ephemeral=True)
+        return
+
+    if not interaction.guild:
+        await interaction.response.send_message("❌ Tämä komento voidaan käyttää vain palvelimella.", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+
+    if not server_config.set_source_horizon(interaction.guild.id, name, days or None):
+        await interaction.followup.send(f"❌ Source named **{name}** not found. Use `/list_menu_sources` to see configured sources.")
+        return
+
+    source = next(s for s in server_config.get_menu_sources(interaction.guild.id) if s.get("name") == name)
+    _, _, urls = resolve_source(interaction.guild.id, source)
+    embed = discord.Embed(title=f"✅ Menu Horizon Set: {name}", color=0x00ff00, timestamp=datetime.now())
+    embed.add_field(name="Days Ahead", value=str(days) if days else "Default", inline=True)
+    embed.add_field(name="Upstream Requests", value=str(len(urls)), inline=True)
+    await interaction.followup.send(embed=embed)
+
+
 @bot.tree.command(name='list_menu_sources', description='List all configured menu sources for this server')
 async def list_menu_sources(interaction: discord.Interaction):
     """List all configured menu sources (Admin only)"""
@@ -1245,6 +1715,8 @@ async def list_menu_sources(interaction: discord.Interaction):
             detail = f"Cost Center: `{source.get('cost_center', '?')}`"
         else:
             detail = f"Customer: `{source.get('customer_id', '?')}`, Kitchen: `{source.get('kitchen_id', '?')}`"
+        if source.get("horizon_days"):
+            detail += f", Horizon: {source['horizon_days']} days"
         url = server_config.get_menu_url_for_source(source)
         short_url = url[:80] + "…" if len(url) > 80 else url
         embed.add_field(
@@ -1307,6 +1779,28 @@ async def show_config(interaction: discord.Interaction):
     await interaction.followup.send(embed=embed)
 
 
+def format_circuit_states() -> str:
+    """One line per upstream host with its circuit breaker state"""
+    icons = {"closed": "🟢", "half_open": "🟡", "open": "🔴"}
+    lines = []
+    for host, circuit in http_client.circuit_states().items():
+        line = f"{icons[circuit['state']]} {host}: {circuit['state']}"
+        if circuit['state'] == "open":
+            line += f" ({circuit['failures']} failure(s), retry in {circuit['retry_in']:.0f}s)"
+        lines.append(line)
+    return "\n".join(lines)
+
+def format_rate_limits() -> str:
+    """One line per upstream host with its rate limiter queue depth and wait times"""
+    lines = []
+    for host, bucket in http_client.rate_limit_stats().items():
+        lines.append(
+            f"🚦 {host}: {bucket['queued']} queued ({bucket['clients']} server(s)), "
+            f"{bucket['delayed']}/{bucket['granted']} delayed, "
+            f"avg wait {bucket['avg_wait']:.1f}s, max {bucket['max_wait']:.1f}s"
+        )
+    return "\n".join(lines)
+
 @bot.tree.command(name='test_api', description='Test the API connection and data parsing for all configured sources')
 async def test_api(interaction: discord.Interaction):
     """Test the API connection and data parsing for this server"""
@@ -1315,21 +1809,52 @@ async def test_api(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
     await interaction.followup.send("🔄 Testing API connection(s)...")
     
-    all_menus = await fetch_all_menus_data(guild_id)
+    # Always go upstream; a source answered from a saved copy (circuit open) failed the test
+    stale = set()
+    all_menus = await fetch_all_menus_data(guild_id, force_refresh=True, stale=stale)
+    source_names = [source.get("name", "Ruokalista") for source in server_config.get_menu_sources(guild_id)]
+    failed = [name for name in source_names if not all_menus or name not in all_menus or name in stale]
     
     if all_menus:
-        embed = discord.Embed(title="✅ API Test Successful", color=0x00ff00, timestamp=datetime.now())
+        if failed:
+            embed = discord.Embed(title="❌ API Test Failed", color=0xff0000, timestamp=datetime.now())
+        else:
+            embed = discord.Embed(title="✅ API Test Successful", color=0x00ff00, timestamp=datetime.now())
         for source_name, menu_data in all_menus.items():
+            if source_name in stale:
+                continue
             days_count = len(menu_data)
-            days_list = list(menu_data.keys())[:3]
+            days_list = [day.label for day in menu_data.days[:3]]
             embed.add_field(
                 name=f"📍 {source_name} — {days_count} day(s)",
                 value="\n".join(days_list) or "No days",
                 inline=False,
             )
+        if failed:
+            embed.add_field(
+                name="❌ Failed sources",
+                value="\n".join(
+                    f"{name} (upstream unavailable, only a saved copy)" if name in stale else f"{name} (no data)"
+                    for name in failed
+                ),
+                inline=False,
+            )
+        circuits = format_circuit_states()
+        if circuits:
+            embed.add_field(name="🔌 Upstream circuits", value=circuits, inline=False)
+        rate_limits = format_rate_limits()
+        if rate_limits:
+            embed.add_field(name="🚦 Upstream rate limits", value=rate_limits, inline=False)
         await interaction.edit_original_response(content=None, embed=embed)
     else:
-        await interaction.edit_original_response(content="❌ API test failed. Check console for error details or verify your sources with `/list_menu_sources`")
+        content = "❌ API test failed. Check console for error details or verify your sources with `/list_menu_sources`"
+        circuits = format_circuit_states()
+        if circuits:
+            content += f"\n\n**Upstream circuits**\n{circuits}"
+        rate_limits = format_rate_limits()
+        if rate_limits:
+            content += f"\n\n**Upstream rate limits**\n{rate_limits}"
+        await interaction.edit_original_response(content=content)
 
 @bot.tree.command(name='cleanup_old_menus', description='Remove old persistent menu views from the database')
 @app_commands.describe(days="Number of days (default: 7) - menus older than this will be removed")
@@ -1343,15 +1868,20 @@ async def cleanup_old_menus(interaction: discord.Interaction, days: int = 7):
     await interaction.response.defer(ephemeral=True)
     
     try:
-        deleted_count = button_db.cleanup_old_menus(days)
+        report = await button_db.cleanup_old_menus_async(days)
         
         embed = discord.Embed(
             title="✅ Cleanup Complete",
             color=0x00ff00,
             timestamp=datetime.now()
         )
-        embed.add_field(name="Removed Views", value=str(deleted_count), inline=True)
+        embed.add_field(name="Removed Views", value=str(report['deleted']), inline=True)
         embed.add_field(name="Older Than", value=f"{days} days", inline=True)
+        embed.add_field(
+            name="Database Size",
+            value=f"{report['size_before'] / 1024:.0f} KiB → {report['size_after'] / 1024:.0f} KiB",
+            inline=False,
+        )
         
         await interaction.followup.send(embed=embed)
     except Exception as e:
@@ -0,0 +1,266 @@
+"""
+Process-wide caching for parsed upstream menu responses
+Entries are keyed on the canonical source URL so guilds sharing a kitchen share one fetch
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+from json_writer import DebouncedJsonWriter
+from menu_model import WeekMenu
+
+
+class MenuCache:
+    """Bounded TTL cache with LRU eviction for parsed menu data"""
+
+    def __init__(self, ttl_seconds: float = 900, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store value under key, evicting the least recently used entries if full"""
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        """Drop a single entry"""
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the current size"""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into a single in-flight task"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run func() for key, or wait for the run that is already in flight"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        else:
+            self.coalesced += 1
+
+        # Shield so one cancelled caller doesn't cancel the shared request for everyone else
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Every waiter may have given up (deadline passed); mark the error as seen so asyncio doesn't warn
+        if not task.cancelled():
+            task.exception()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._inflight
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+class ValidatorCache:
+    """Remembers the HTTP validators, body hash and parsed result of the last good response per URL.
+
+    Lets the fetch layer send conditional requests (If-None-Match / If-Modified-Since) and,
+    for providers that ignore them, skip re-parsing a body identical to the previous one.
+    Entries outlive the MenuCache TTL on purpose: they are what revalidation is checked against.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.not_modified_hits = 0  # 304 responses answered from the stored parse
+        self.unchanged_body_hits = 0  # 200 responses whose body matched the stored hash
+
+    @staticmethod
+    def hash_body(body: bytes) -> str:
+        return hashlib.sha256(body).hexdigest()
+
+    def request_headers(self, key: str) -> Dict[str, str]:
+        """Return the conditional request headers for key (empty if nothing is stored)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return {}
+
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def not_modified(self, key: str) -> Optional[Any]:
+        """Return the stored parse after a 304 response, or None if it was evicted meanwhile"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        self.not_modified_hits += 1
+        return entry["parsed"]
+
+    def unchanged(self, key: str, body_hash: str, headers: Mapping[str, str]) -> Optional[Any]:
+        """Return the stored parse if a 200 response carried the same body as last time"""
+        entry = self._entries.get(key)
+        if entry is None or entry["body_hash"] != body_hash:
+            return None
+
+        # The body is the same, but the server may have rotated its validators
+        entry["etag"] = headers.get("ETag")
+        entry["last_modified"] = headers.get("Last-Modified")
+        self._entries.move_to_end(key)
+        self.unchanged_body_hits += 1
+        return entry["parsed"]
+
+    def store(self, key: str, body_hash: Optional[str], parsed: Any, headers: Mapping[str, str]) -> None:
+        """Remember a freshly parsed response and the validators it came with"""
+        self._entries[key] = {
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "body_hash": body_hash,
+            "parsed": parsed,
+        }
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def export(self, key: str) -> Dict[str, Optional[str]]:
+        """Return the stored validators and body hash for key (all None if nothing is stored)"""
+        entry = self._entries.get(key, {})
+        return {name: entry.get(name) for name in ("etag", "last_modified", "body_hash")}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "not_modified": self.not_modified_hits,
+            "unchanged_bodies": self.unchanged_body_hits,
+            "size": len(self._entries),
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class MenuStore:
+    """Parsed menus persisted to the config volume, so a restarted bot can answer before its first fetch.
+
+    The file is read on first use and each entry is only turned back into a WeekMenu when it
+    is asked for. Writes go through a DebouncedJsonWriter, off the event loop via a temp file and rename.
+    """
+
+    def __init__(self, path: str = "config/menu_cache.json", save_delay: float = 5.0, max_entries: int = 256):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None  # raw JSON entries, loaded lazily
+        self._decoded: Dict[str, WeekMenu] = {}
+        self._writer = DebouncedJsonWriter(path, self._serialize, save_delay, label="menu store")
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self._entries = json.load(f).get("entries", {})
+                    print(f"Loaded {len(self._entries)} stored menu(s) from {self.path}")
+                except (json.JSONDecodeError, OSError, AttributeError) as e:
+                    print(f"Error loading menu store {self.path}: {e}")
+        return self._entries
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return {"menu", "fetched_at", "etag", "last_modified", "body_hash"} for key, or None"""
+        entry = self._load().get(key)
+        if entry is None:
+            return None
+
+        menu = self._decoded.get(key)
+        if menu is None:
+            try:
+                menu = WeekMenu(WeekMenu.from_json(entry["menu"]).days, {
+                    language: WeekMenu.from_json(days) for language, days in entry.get("translations", {}).items()
+                })
+            except (KeyError, ValueError, AttributeError) as e:
+                print(f"Dropping unreadable stored menu for {key}: {e}")
+                self._entries.pop(key, None)
+                return None
+            self._decoded[key] = menu
+        return {**entry, "menu": menu}
+
+    def put(self, key: str, menu: WeekMenu, validators: Optional[Mapping[str, Optional[str]]] = None,
+            fetched_at: Optional[float] = None) -> None:
+        """Store a freshly fetched menu and schedule a write"""
+        entries = self._load()
+        entries[key] = {
+            "fetched_at": fetched_at if fetched_at is not None else time.time(),
+            **(validators or {}),
+            "menu": menu.to_json(iso_dates=True),
+        }
+        if menu.translations:
+            entries[key]["translations"] = {
+                language: translated.to_json(iso_dates=True) for language, translated in menu.translations.items()
+            }
+        self._decoded[key] = menu
+        self._writer.schedule()
+
+    def _serialize(self) -> str:
+        """Prune and serialise the entries (called by the writer on the loop thread, so it can't race a put)"""
+        # Menus whose last day has passed are useless after a restart; beyond that keep the newest ones
+        today = date.today().isoformat()
+        entries = self._load()
+        for key in [k for k, e in entries.items() if max(e.get("menu") or [""]) < today]:
+            entries.pop(key, None)
+            self._decoded.pop(key, None)
+        for key in sorted(entries, key=lambda k: entries[k]["fetched_at"])[:max(len(entries) - self.max_entries, 0)]:
+            entries.pop(key, None)
+            self._decoded.pop(key, None)
+
+        return json.dumps({"entries": entries}, ensure_ascii=False, separators=(',', ':'))
+
+    def flush(self) -> None:
+        """Write any pending changes right now (used on shutdown)"""
+        self._writer.flush()
+
+    def __len__(self) -> int:
+        return len(self._load())
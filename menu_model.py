@@ -0,0 +1,178 @@
+"""
+Compact in-memory representation of parsed menus
+Parsers build one immutable WeekMenu per source; views, caches and database rows all share it
+"""
+import hashlib
+import json
+import sys
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# Label format of the legacy JSON shape: {"Monday, October 19": {"Lounas": ["..."]}}
+DAY_LABEL_FORMAT = "%A, %B %d"
+
+
+class MenuCategory(NamedTuple):
+    """One meal category (e.g. "Lounas") and its dishes"""
+    name: str
+    items: Tuple[str, ...]
+
+
+class MenuDay(NamedTuple):
+    """Every category served on one date"""
+    date: date
+    categories: Tuple[MenuCategory, ...]
+
+    @property
+    def label(self) -> str:
+        """Display name of the day (e.g. Monday, October 19)"""
+        return self.date.strftime(DAY_LABEL_FORMAT)
+
+    def has_items(self) -> bool:
+        return any(category.items for category in self.categories)
+
+
+def parse_day_label(label: str, today: Optional[date] = None) -> date:
+    """Resolve a day key from the JSON shape to a date.
+
+    Legacy labels carry no year, so the matching date closest to today is used.
+    """
+    try:
+        return date.fromisoformat(label)
+    except ValueError:
+        pass
+
+    today = today or date.today()
+    weekday = label.split(",", 1)[0].strip()
+    candidates = []
+    for year in (today.year - 1, today.year, today.year + 1):
+        try:
+            candidates.append(datetime.strptime(f"{label} {year}", f"{DAY_LABEL_FORMAT} %Y").date())
+        except ValueError:
+            continue  # e.g. February 29 in a non-leap year
+
+    if not candidates:
+        raise ValueError(f"Unrecognised menu day label: {label!r}")
+
+    # strptime doesn't check the weekday name, so prefer the year where it matches
+    matching = [day for day in candidates if day.strftime("%A") == weekday] or candidates
+    return min(matching, key=lambda day: abs((day - today).days))
+
+
+class WeekMenu:
+    """Date-ordered menu days for one source.
+
+    Category names and dishes are interned, so the same strings repeated across
+    days, weeks and sources are stored once per process.
+
+    Providers that return several languages in one response keep the other languages
+    in translations ({language: WeekMenu}); in_language picks one at render time.
+    """
+
+    __slots__ = ("days", "_index", "translations", "_content_hash")
+
+    def __init__(self, days=(), translations: Optional[Dict[str, "WeekMenu"]] = None):
+        ordered: Dict[date, MenuDay] = {}
+        for day in days:
+            ordered[day.date] = day  # a later window wins for a duplicated date
+        self.days: Tuple[MenuDay, ...] = tuple(ordered[d] for d in sorted(ordered))
+        self._index: Dict[date, int] = {day.date: i for i, day in enumerate(self.days)}
+        self.translations: Dict[str, WeekMenu] = translations or {}
+        self._content_hash: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, days: Dict[date, Dict[str, List[str]]]) -> "WeekMenu":
+        """Build a menu from the parsers' {date: {category: [items]}} working dict"""
+        return cls(
+            MenuDay(day, tuple(
+                MenuCategory(sys.intern(name), tuple(sys.intern(item) for item in items))
+                for name, items in categories.items()
+            ))
+            for day, categories in days.items()
+        )
+
+    @classmethod
+    def from_languages(cls, languages: Dict[str, Dict[date, Dict[str, List[str]]]],
+                       default_language: str = "fi") -> "WeekMenu":
+        """Build a multilingual menu from {language: working dict}; the default language is the menu itself.
+
+        Without the default language, the first language in the dict's order is used.
+        """
+        if not languages:
+            return cls()
+        default = default_language if default_language in languages else next(iter(languages))
+        return cls(cls.from_dict(languages[default]).days, {
+            language: cls.from_dict(days) for language, days in languages.items() if language != default
+        })
+
+    @classmethod
+    def merge(cls, menus: Iterable["WeekMenu"]) -> "WeekMenu":
+        """Combine menus fetched for different date windows (later menus win for a duplicated date)"""
+        menus = list(menus)
+        languages = dict.fromkeys(language for menu in menus for language in menu.translations)
+        return cls((day for menu in menus for day in menu.days), {
+            language: cls(day for menu in menus for day in menu.in_language(language).days)
+            for language in languages
+        })
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Dict[str, List[str]]], today: Optional[date] = None) -> "WeekMenu":
+        """Load the JSON shape written by to_json (or stored by older versions of the bot)"""
+        return cls.from_dict({parse_day_label(label, today): categories for label, categories in data.items()})
+
+    def to_json(self, iso_dates: bool = False) -> Dict[str, Dict[str, List[str]]]:
+        """Return the legacy {day label: {category: [items]}} shape.
+
+        With iso_dates the days are keyed by YYYY-MM-DD instead, which from_json also reads
+        and which stays unambiguous for data kept across a year boundary.
+        """
+        return {
+            (day.date.isoformat() if iso_dates else day.label): {
+                category.name: list(category.items) for category in day.categories
+            }
+            for day in self.days
+        }
+
+    def upcoming(self, today: date) -> "WeekMenu":
+        """Return the menu without days before today (self if nothing needs dropping)"""
+        if not self.days or self.days[0].date >= today:
+            return self
+        return WeekMenu((day for day in self.days if day.date >= today), {
+            language: menu.upcoming(today) for language, menu in self.translations.items()
+        })
+
+    def in_language(self, language: Optional[str]) -> "WeekMenu":
+        """Return the menu in language, or self if that language isn't available"""
+        if not language:
+            return self
+        return self.translations.get(language, self)
+
+    @property
+    def content_hash(self) -> str:
+        """SHA-256 of the menu's days, computed once per object (menus are shared from the menu cache)"""
+        if self._content_hash is None:
+            payload = json.dumps(self.to_json(iso_dates=True), ensure_ascii=False, separators=(',', ':'))
+            self._content_hash = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        return self._content_hash
+
+    def get(self, day: date) -> Optional[MenuDay]:
+        index = self._index.get(day)
+        return self.days[index] if index is not None else None
+
+    def index_of(self, day: date) -> Optional[int]:
+        return self._index.get(day)
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def __iter__(self) -> Iterator[MenuDay]:
+        return iter(self.days)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, WeekMenu) and self.days == other.days
+
+    def __hash__(self) -> int:
+        return hash(self.days)
+
+    def __repr__(self) -> str:
+        return f"WeekMenu({len(self.days)} day(s))"
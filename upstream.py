@@ -0,0 +1,327 @@
+"""
+Shared HTTP client for the upstream menu APIs (Jamix, Mealdoo, Compass Group)
+One pooled aiohttp session lives for the lifetime of the bot
+"""
+import asyncio
+import json
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Hashable, Mapping, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+# Statuses that mean the host is struggling (worth retrying and counting against its circuit)
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_host_rates(spec: str) -> Dict[str, Tuple[float, int]]:
+    """Parse "host=rate/burst,host=rate/burst" into {host: (rate, burst)}; the burst is optional"""
+    rates = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        try:
+            host, limits = part.split("=", 1)
+            rate, _, burst = limits.partition("/")
+            rates[host.strip().lower()] = (float(rate), int(burst) if burst else max(int(float(rate)), 1))
+        except ValueError:
+            print(f"Ignoring malformed upstream rate limit: {part!r}")
+    return rates
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to a host whose circuit breaker is open"""
+
+
+class UpstreamResponse(NamedTuple):
+    """A fully read upstream response"""
+    status: int
+    headers: Mapping[str, str]
+    body: bytes
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+    def text(self) -> str:
+        return self.body.decode('utf-8', errors='replace')
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one upstream host.
+
+    closed: requests flow. open: requests fail fast until reset_timeout has passed.
+    half_open: one trial request is let through; its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Return True if a request may be sent now"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()  # (re-)open, including after a failed trial
+
+    def abandon_trial(self) -> None:
+        """Forget a trial request that was cancelled before it finished"""
+        self._trial_in_flight = False
+
+    def retry_in(self) -> float:
+        """Seconds until the next trial request is allowed (0 if not open)"""
+        if self.opened_at is None:
+            return 0.0
+        return max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+
+
+class FairTokenBucket:
+    """Token bucket for one upstream host that hands out tokens round-robin across clients.
+
+    A request takes a token immediately while the bucket has one and nobody is queued.
+    Otherwise it joins its client's queue (one per guild), and a dispatcher serves the queues
+    in turn as tokens refill, so one guild with many sources can't starve the others.
+    """
+
+    def __init__(self, rate: float = 2.0, burst: int = 5):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.queues: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.granted = 0
+        self.delayed = 0  # grants that had to queue
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    async def acquire(self, client: Hashable = None) -> float:
+        """Wait for a token on behalf of client; returns the seconds spent waiting"""
+        self._refill()
+        if not self.queues and self.tokens >= 1:
+            self.tokens -= 1
+            self.granted += 1
+            return 0.0
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(client, deque()).append(waiter)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+        started = time.monotonic()
+        await waiter  # a cancelled waiter is skipped by the dispatcher
+        waited = time.monotonic() - started
+        self.delayed += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    async def _dispatch(self) -> None:
+        while self.queues:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+
+            client, queue = next(iter(self.queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self.queues.move_to_end(client)  # this client's next request waits for everyone else's turn
+            else:
+                del self.queues[client]
+            if waiter.done():
+                continue
+
+            self.tokens -= 1
+            self.granted += 1
+            waiter.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue_depth(),
+            "clients": len(self.queues),
+            "granted": self.granted,
+            "delayed": self.delayed,
+            "avg_wait": self.total_wait / self.delayed if self.delayed else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+
+class UpstreamClient:
+    """Owns the long-lived aiohttp session used for every upstream fetch"""
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 10,
+                 keepalive_timeout: float = 60, dns_cache_ttl: int = 300,
+                 connect_timeout: float = 5, read_timeout: float = 15,
+                 retries: int = 2, backoff_base: float = 0.5, backoff_max: float = 8,
+                 failure_threshold: int = 5, reset_timeout: float = 60, max_concurrency: int = 8,
+                 rate: float = 2.0, burst: int = 5,
+                 host_rates: Optional[Mapping[str, Tuple[float, int]]] = None):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.rate = rate
+        self.burst = burst
+        self.host_rates = dict(host_rates or {})  # host -> (requests per second, burst) overrides
+        self.buckets: Dict[str, FairTokenBucket] = {}
+        # Global cap on requests in flight; only the round-trip counts, not the wait for a token or a retry
+        self._concurrency = asyncio.Semaphore(max_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self) -> None:
+        """Create the pooled session (must be called from inside the running event loop)"""
+        if self._session is not None and not self._session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=self.connect_timeout,
+            sock_connect=self.connect_timeout,
+            sock_read=self.read_timeout,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        print(f"Upstream HTTP session started (limit_per_host={self.limit_per_host})")
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, starting it lazily if needed"""
+        if self._session is None or self._session.closed:
+            await self.start()
+        assert self._session is not None
+        return self._session
+
+    def breaker_for(self, url: str) -> CircuitBreaker:
+        host = urlsplit(url).hostname or url
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return breaker
+
+    def bucket_for(self, url: str) -> FairTokenBucket:
+        host = urlsplit(url).hostname or url
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            rate, burst = self.host_rates.get(host, (self.rate, self.burst))
+            bucket = self.buckets[host] = FairTokenBucket(rate, burst)
+        return bucket
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: spreads out retries from many callers hitting the same failing host
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None,
+                  client: Hashable = None) -> UpstreamResponse:
+        """GET url through the host's rate limiter and circuit breaker, retrying transient failures with backoff.
+
+        client identifies who the request is for (the guild), so the rate limiter can queue fairly.
+        Raises CircuitOpenError without sending anything while the host's circuit is open.
+        After the last attempt a retryable status is returned as is; a connection error is raised.
+        """
+        breaker = self.breaker_for(url)
+        bucket = self.bucket_for(url)
+        session = await self.get_session()
+
+        for attempt in range(self.retries + 1):
+            if breaker.state == "open":
+                # Checked before queueing too, so callers don't wait for a token just to fail fast
+                raise CircuitOpenError(
+                    f"Circuit open for {urlsplit(url).hostname}, retrying in {breaker.retry_in():.0f}s"
+                )
+            await bucket.acquire(client)
+            if not breaker.allow():
+                raise CircuitOpenError(
+                    f"Circuit open for {urlsplit(url).hostname}, retrying in {breaker.retry_in():.0f}s"
+                )
+
+            try:
+                async with self._concurrency, session.get(url, headers=headers) as response:
+                    result = UpstreamResponse(response.status, response.headers, await response.read())
+            except asyncio.CancelledError:
+                breaker.abandon_trial()
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                breaker.record_failure()
+                if attempt == self.retries:
+                    raise
+                print(f"Upstream request failed ({e.__class__.__name__}: {e}), retrying: {url}")
+            except Exception:
+                # Not the host's fault (e.g. the session was closed during shutdown), but a half-open
+                # trial must still be released or the host stays cut off
+                breaker.abandon_trial()
+                raise
+            else:
+                if result.status not in RETRYABLE_STATUSES:
+                    breaker.record_success()
+                    return result
+                breaker.record_failure()
+                if attempt == self.retries:
+                    return result
+                print(f"Upstream returned {result.status}, retrying: {url}")
+
+            await asyncio.sleep(self._backoff(attempt))
+
+    def circuit_states(self) -> Dict[str, Dict[str, Any]]:
+        """Return {host: {"state", "failures", "retry_in"}} for every host seen so far"""
+        return {
+            host: {"state": breaker.state, "failures": breaker.failures, "retry_in": breaker.retry_in()}
+            for host, breaker in sorted(self.breakers.items())
+        }
+
+    def rate_limit_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return {host: FairTokenBucket.stats()} for every host seen so far"""
+        return {host: bucket.stats() for host, bucket in sorted(self.buckets.items())}
+
+    async def close(self) -> None:
+        """Close the session and release pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            print("Upstream HTTP session closed")
+        self._session = None